@@ -5,10 +5,15 @@ from dash import html, dcc, Dash
 from components.navbar import create_navbar
 from components.footer import create_footer
 from utils import data_loader
+from utils import config_registry
+from utils import report_download
 
 app = Dash(__name__, suppress_callback_exceptions=True, external_stylesheets=[dbc.themes.LUX], use_pages=True)
 app.config.suppress_callback_exceptions = True
+data_loader.load_content_bundle()
 config_json, stores = data_loader.load_config_json_and_store()
+config_registry.load_config(config_json)
+report_download.register_download_route(app.server)
 
 app.layout = html.Div([
 
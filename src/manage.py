@@ -0,0 +1,66 @@
+"""
+Build commands for the climate narrative app.
+
+Run from the repository root, e.g.:
+	python src/manage.py compile-content
+	python src/manage.py compile-config
+	python src/manage.py compile-images
+	python src/manage.py compile-chart-data
+	python src/manage.py clear-report-cache
+"""
+import argparse
+
+from utils import chart_data
+from utils import content_bundle
+from utils import data_loader
+from utils import image_cache
+from utils import report_cache
+from utils import report_download
+
+
+def compile_content(args):
+	bundle = content_bundle.compile_content_bundle()
+	print(f"Compiled {len(bundle['files'])} YAML files (content hash {bundle['content_hash'][:12]})")
+
+def compile_config(args):
+	config_json = data_loader.convert_config_excel_to_json()
+	print(f"Compiled {len(config_json['sheets'])} config sheets (source hash {config_json['source_sha256'][:12]})")
+
+def compile_images(args):
+	index = image_cache.compile_image_sidecar()
+	print(f"Encoded {len(index['files'])} images under {image_cache.IMAGE_SIDECAR_PATH}")
+
+def compile_chart_data(args):
+	for dataset_name in chart_data.CHART_DATASETS:
+		compiled = chart_data.compile_chart_data(dataset_name)
+		print(f"Compiled {dataset_name} chart data ({len(compiled['df'])} rows)")
+
+def clear_report_cache(args):
+	report_cache.clear_report_cache(clear_disk=True)
+	report_download.clear_report_downloads()
+	print(f"Cleared reports cached under {report_cache.REPORT_CACHE_PATH} and {report_download.REPORT_DOWNLOAD_PATH}")
+
+def main(argv=None):
+	parser = argparse.ArgumentParser(description='Build commands for the climate narrative app.')
+	subparsers = parser.add_subparsers(dest='command', required=True)
+	subparsers.add_parser(
+		'compile-content', help='Compile all page_contents YAML files into one binary snapshot.'
+	).set_defaults(func=compile_content)
+	subparsers.add_parser(
+		'compile-config', help='Convert config.xlsx into config.json, recording the hash of the Excel file.'
+	).set_defaults(func=compile_config)
+	subparsers.add_parser(
+		'compile-images', help='Precompute the data URIs of all images inlined into exported reports.'
+	).set_defaults(func=compile_images)
+	subparsers.add_parser(
+		'compile-chart-data', help='Parse the chart CSVs into typed binary copies for fast loading.'
+	).set_defaults(func=compile_chart_data)
+	subparsers.add_parser(
+		'clear-report-cache', help='Remove all generated reports and report downloads persisted to disk.'
+	).set_defaults(func=clear_report_cache)
+	args = parser.parse_args(argv)
+	args.func(args)
+
+
+if __name__ == '__main__':
+	main()
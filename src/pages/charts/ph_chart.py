@@ -1,17 +1,16 @@
 import dash
 from dash import html, dcc, Input, Output
-import pandas as pd
-import plotly.express as px
+from utils import chart_data
 
 # Register the page still works independently at /charts/ph_chart
 dash.register_page(__name__, path='/charts/ph_chart')
 
 # Load data
-df_ph = pd.read_csv("src/assets/data/physical_risk_data.csv")
+df_ph = chart_data.load_chart_data('physical_risk')
 
 # Extract year columns
 def get_years_ph(df):
-    return [int(col) for col in df.columns if str(col).isdigit()]
+    return chart_data.get_chart_years(df)
 
 # --- NEW: return only filters + graph (no H1) for embedding on /charts ---
 def embedded_content():
@@ -69,7 +68,7 @@ def layout():
 )
 def update_ph_region(reset_clicks):
     region_options = [{'label': r, 'value': r}
-                      for r in sorted(df_ph['Region'].dropna().unique())]
+                      for r in chart_data.get_chart_regions('physical_risk')]
     return region_options, None
 
 @dash.callback(
@@ -80,9 +79,8 @@ def update_ph_region(reset_clicks):
 def update_ph_variable(region):
     if region is None:
         return [], None
-    filtered_df = df_ph[df_ph['Region'] == region]
     variable_options = [{'label': v, 'value': v}
-                        for v in sorted(filtered_df['Variable'].dropna().unique())]
+                        for v in chart_data.get_chart_variables('physical_risk', region)]
     return variable_options, None
 
 @dash.callback(
@@ -94,12 +92,8 @@ def update_ph_variable(region):
 def update_ph_scenario(region, variable):
     if region is None or variable is None:
         return [], []
-    filtered_df = df_ph[
-        (df_ph['Region'] == region) &
-        (df_ph['Variable'] == variable)
-    ]
     scenario_options = [{'label': s, 'value': s}
-                        for s in sorted(filtered_df['Scenario'].dropna().unique())]
+                        for s in chart_data.get_chart_scenarios('physical_risk', region, variable)]
     return scenario_options, []
 
 @dash.callback(
@@ -116,17 +110,8 @@ def update_ph_year_slider(region, variable, scenarios):
     if not region or not variable or not scenarios:
         years = get_years_ph(df_ph)
     else:
-        # Filter by selected region/variable/scenarios
-        filtered_df = df_ph[
-            (df_ph['Region'] == region) &
-            (df_ph['Variable'] == variable) &
-            (df_ph['Scenario'].isin(scenarios))
-        ]
-        # Keep years that have at least one non-NA value
-        years = [
-            int(col) for col in filtered_df.columns
-            if str(col).isdigit() and filtered_df[col].notna().any()
-        ]
+        # Keep years that have at least one non-NA value for the selected region/variable/scenarios
+        years = chart_data.get_chart_data_years('physical_risk', region, variable, scenarios)
         if not years:
             return 2020, 2100, [2020, 2100], {2020: '2020', 2100: '2100'}
 
@@ -143,7 +128,26 @@ def update_ph_year_slider(region, variable, scenarios):
     Input('ph-year-slider', 'value')
 )
 def update_ph_chart(region, variable, scenarios, year_range):
-    background = '#FFFFFF'
+    # Figures are cached by data version and selection; the placeholder figures are built once
+    if not region or not variable or not scenarios:
+        figure_key = ('physical_risk', 'placeholder', 'select')
+    else:
+        all_years = get_years_ph(df_ph)
+        if not year_range:
+            selected_years = all_years
+        else:
+            selected_years = [y for y in all_years if year_range[0] <= y <= year_range[1]]
+        if chart_data.select_chart_rows('physical_risk', region, variable, scenarios).empty or not selected_years:
+            figure_key = ('physical_risk', 'placeholder', 'no-data')
+        else:
+            # Scenarios keep their selection order, which sets the legend order
+            figure_key = (
+                'physical_risk', chart_data.get_chart_data_version('physical_risk'),
+                region, variable, tuple(scenarios), tuple(year_range or ())
+            )
+    return chart_data.get_chart_figure(figure_key, lambda: build_ph_chart_figure(region, variable, scenarios, year_range))
+
+def build_ph_chart_figure(region, variable, scenarios, year_range):
 
     def add_footer(fig, text, font_size=14):
         fig.update_layout(margin=dict(t=40, r=20, l=60, b=140))
@@ -180,24 +184,12 @@ def update_ph_chart(region, variable, scenarios, year_range):
         return fig
 
     if not region or not variable or not scenarios:
-        fig = px.line(title=None)
-        fig.update_layout(
-            plot_bgcolor=background,
-            paper_bgcolor=background,
-            font=dict(color="#222"),
-            xaxis=dict(gridcolor="#EEE"),
-            yaxis=dict(gridcolor="#EEE"),
-            showlegend=False,
-            yaxis_title=None
-        )
+        fig = chart_data.build_empty_figure()
+        fig.update_layout(showlegend=False)
         fig = add_footer(fig, "Please select region, variable, and at least one scenario to display the chart")
         return fig
 
-    filtered_df = df_ph[
-        (df_ph['Region'] == region) &
-        (df_ph['Variable'] == variable) &
-        (df_ph['Scenario'].isin(scenarios))
-    ]
+    filtered_df = chart_data.select_chart_rows('physical_risk', region, variable, scenarios)
 
     all_years = get_years_ph(df_ph)
     if not year_range:
@@ -206,42 +198,14 @@ def update_ph_chart(region, variable, scenarios, year_range):
         selected_years = [y for y in all_years if year_range[0] <= y <= year_range[1]]
 
     if filtered_df.empty or not selected_years:
-        fig = px.line(title=None)
-        fig.update_layout(
-            plot_bgcolor=background,
-            paper_bgcolor=background,
-            font=dict(color="#222"),
-            xaxis=dict(gridcolor="#EEE"),
-            yaxis=dict(gridcolor="#EEE"),
-            showlegend=False,
-            yaxis_title=None
-        )
+        fig = chart_data.build_empty_figure()
+        fig.update_layout(showlegend=False)
         fig = add_footer(fig, "No data available for the selected filters")
         return fig
 
-    melted_df = filtered_df.melt(
-        id_vars=['Region', 'Variable', 'Scenario'],
-        value_vars=[str(y) for y in selected_years],
-        var_name='Year', value_name='Value'
-    )
-    melted_df['Year'] = melted_df['Year'].astype(int)
-
-    fig = px.line(
-        melted_df,
-        x='Year',
-        y='Value',
-        color='Scenario',
-        category_orders={'Scenario': scenarios}
-    )
+    fig = chart_data.build_scenario_line_figure(filtered_df, selected_years, scenario_order=scenarios)
     fig.update_layout(
-        title=None,
-        plot_bgcolor=background,
-        paper_bgcolor=background,
-        font=dict(color="#222"),
-        xaxis=dict(gridcolor="#EEE"),
-        yaxis=dict(gridcolor="#EEE"),
         showlegend=True,
-        legend_title_text="Scenario",
         yaxis_title=variable
     )
     scenario_text = ", ".join(scenarios)
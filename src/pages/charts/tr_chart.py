@@ -1,16 +1,16 @@
 import dash
 from dash import html, dcc, Input, Output
-import pandas as pd
-import plotly.express as px
+import plotly.colors
+from utils import chart_data
 
 # Register the page still works independently at /charts/tr_chart
 dash.register_page(__name__, path='/charts/tr_chart')
 
 # Load data
-df = pd.read_csv("src/assets/data/transition_risk_data.csv")
+df = chart_data.load_chart_data('transition_risk')
 
 def get_years(df):
-    return [int(col) for col in df.columns if str(col).isdigit()]
+    return chart_data.get_chart_years(df)
 
 # ---  return only filters + graph (no H1) for embedding on /charts ---
 def embedded_content():
@@ -52,7 +52,7 @@ def layout():
     Input('reset-button', 'n_clicks')
 )
 def update_region(reset_clicks):
-    region_options = [{'label': r, 'value': r} for r in sorted(df['Region'].dropna().unique())]
+    region_options = [{'label': r, 'value': r} for r in chart_data.get_chart_regions('transition_risk')]
     return region_options, None
 
 @dash.callback(
@@ -63,8 +63,7 @@ def update_region(reset_clicks):
 def update_variable(region):
     if region is None:
         return [], None
-    filtered_df = df[df['Region'] == region]
-    variable_options = [{'label': v, 'value': v} for v in sorted(filtered_df['Variable'].dropna().unique())]
+    variable_options = [{'label': v, 'value': v} for v in chart_data.get_chart_variables('transition_risk', region)]
     return variable_options, None
 
 @dash.callback(
@@ -76,11 +75,9 @@ def update_variable(region):
 def update_scenario(region, variable):
     if not all([region, variable]):
         return [], None
-    filtered_df = df[
-        (df['Region'] == region) &
-        (df['Variable'] == variable)
+    scenario_options = [
+        {'label': s, 'value': s} for s in chart_data.get_chart_scenarios('transition_risk', region, variable)
     ]
-    scenario_options = [{'label': s, 'value': s} for s in sorted(filtered_df['Scenario'].dropna().unique())]
     return scenario_options, None
 
 @dash.callback(
@@ -98,12 +95,7 @@ def update_year_slider(region, variable, scenarios):
         return min(years), max(years), [min(years), max(years)], {year: str(year) for year in years if year % 10 == 0}
     if not isinstance(scenarios, list):
         scenarios = [scenarios]
-    filtered_df = df[
-        (df['Region'] == region) &
-        (df['Variable'] == variable) &
-        (df['Scenario'].isin(scenarios))
-    ]
-    years = [int(col) for col in filtered_df.columns if str(col).isdigit() and not filtered_df[col].isna().all()]
+    years = chart_data.get_chart_data_years('transition_risk', region, variable, scenarios)
     if not years:
         return 2025, 2100, [2025, 2100], {2025: '2025', 2100: '2100'}
     marks = {year: str(year) for year in years if year % 10 == 0}
@@ -117,8 +109,26 @@ def update_year_slider(region, variable, scenarios):
     Input('year-slider', 'value')
 )
 def update_chart(region, variable, scenarios, year_range):
-    palette = px.colors.qualitative.Plotly
-    background = '#FFFFFF'
+    # Figures are cached by data version and selection; the placeholder figures are built once
+    if not all([region, variable, scenarios]):
+        figure_key = ('transition_risk', 'placeholder', 'select')
+    else:
+        if not isinstance(scenarios, list):
+            scenarios = [scenarios]
+        years = get_years(df)
+        selected_years = years if not year_range else [y for y in years if year_range[0] <= y <= year_range[1]]
+        if chart_data.select_chart_rows('transition_risk', region, variable, scenarios).empty or not selected_years:
+            figure_key = ('transition_risk', 'placeholder', 'no-data')
+        else:
+            # Trace order follows the data, not the order of the selected scenarios
+            figure_key = (
+                'transition_risk', chart_data.get_chart_data_version('transition_risk'),
+                region, variable, tuple(sorted(scenarios)), tuple(year_range or ())
+            )
+    return chart_data.get_chart_figure(figure_key, lambda: build_chart_figure(region, variable, scenarios, year_range))
+
+def build_chart_figure(region, variable, scenarios, year_range):
+    palette = plotly.colors.qualitative.Plotly
 
     def add_footer(fig, text, font_size=14):
         fig.update_layout(margin=dict(t=40, r=20, l=60, b=140))
@@ -157,58 +167,25 @@ def update_chart(region, variable, scenarios, year_range):
         return fig
 
     if not all([region, variable, scenarios]):
-        fig = px.line(title=None)
-        fig.update_layout(
-            plot_bgcolor=background,
-            paper_bgcolor=background,
-            font=dict(color="#222"),
-            xaxis=dict(gridcolor="#EEE"),
-            yaxis=dict(gridcolor="#EEE"),
-            showlegend=False
-        )
+        fig = chart_data.build_empty_figure()
+        fig.update_layout(showlegend=False)
         fig = add_footer(fig, "Please select all options to display the chart")
         return fig
 
     if not isinstance(scenarios, list):
         scenarios = [scenarios]
-    filtered_df = df[
-        (df['Region'] == region) &
-        (df['Variable'] == variable) &
-        (df['Scenario'].isin(scenarios))
-    ]
+    filtered_df = chart_data.select_chart_rows('transition_risk', region, variable, scenarios)
     years = get_years(df)
     selected_years = years if not year_range else [y for y in years if year_range[0] <= y <= year_range[1]]
     if filtered_df.empty or not selected_years:
-        fig = px.line(title=None)
-        fig.update_layout(
-            plot_bgcolor=background,
-            paper_bgcolor=background,
-            font=dict(color="#222"),
-            xaxis=dict(gridcolor="#EEE"),
-            yaxis=dict(gridcolor="#EEE"),
-            showlegend=False
-        )
+        fig = chart_data.build_empty_figure()
+        fig.update_layout(showlegend=False)
         fig = add_footer(fig, "No data available for the selected filters")
         return fig
-    melted_df = filtered_df.melt(
-        id_vars=['Region', 'Variable', 'Scenario'],
-        value_vars=[str(y) for y in selected_years],
-        var_name='Year', value_name='Value'
-    )
-    fig = px.line(
-        melted_df,
-        x='Year',
-        y='Value',
-        color='Scenario',
-        color_discrete_sequence=palette
+    fig = chart_data.build_scenario_line_figure(
+        filtered_df, selected_years, colors=palette, year_labels=[str(y) for y in selected_years]
     )
     fig.update_layout(
-        title=None,
-        plot_bgcolor=background,
-        paper_bgcolor=background,
-        font=dict(color="#222"),
-        xaxis=dict(gridcolor="#EEE"),
-        yaxis=dict(gridcolor="#EEE"),
         showlegend=True,
         yaxis_title=variable
     )
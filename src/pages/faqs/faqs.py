@@ -1,10 +1,9 @@
 import dash
 from dash import html, dcc, callback, Output, Input, State, ALL
 import dash_bootstrap_components as dbc
-import yaml
 import json
-from pathlib import Path
 import pydash
+from utils import data_loader
 
 dash.register_page(__name__, path='/faqs')
 
@@ -38,18 +37,16 @@ def _ordered_topics(yml_dict: dict) -> list:
 
 def layout():
     # Define paths
-    YML_FOLDER = "../../assets/page_contents/section/faqs"
-    FILE_PATH = Path(__file__).parent
-    YML_DIR = FILE_PATH.joinpath(YML_FOLDER).resolve()
+    YML_FOLDER = "section/faqs"
+    YML_DIR = data_loader.PAGE_CONTENTS_PATH.joinpath(YML_FOLDER)
 
     # Load all YML files in the folder
     yml = {}
     for yml_file in sorted(YML_DIR.glob("*.yml")):  # sort for determinism; final order is controlled below
-        with open(yml_file, encoding="utf-8") as f:
-            data = yaml.safe_load(f) or {}
-            # Normalize keys to lower-case to match DESIRED_ORDER/LABEL_MAP
-            normalized = {str(k).strip().lower(): v for k, v in data.items()}
-            yml.update(normalized)
+        data = data_loader.load_yml_file(YML_FOLDER, yml_file.name) or {}
+        # Normalize keys to lower-case to match DESIRED_ORDER/LABEL_MAP
+        normalized = {str(k).strip().lower(): v for k, v in data.items()}
+        yml.update(normalized)
 
     topics = _ordered_topics(yml)
     default_topic = topics[0] if topics else None
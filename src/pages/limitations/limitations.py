@@ -1,18 +1,16 @@
 import dash
 from dash import html, dcc, callback, Output, Input, State, ALL
 import dash_bootstrap_components as dbc
-import yaml
 import json
-from pathlib import Path
 import re
+from utils import data_loader
 
 dash.register_page(__name__, path='/limitations')
 
 def layout():
     # define paths
-    YML_FOLDER = "../../assets/page_contents/section/limitations"
-    FILE_PATH = Path(__file__).parent
-    YML_DIR = FILE_PATH.joinpath(YML_FOLDER).resolve()
+    YML_FOLDER = "section/limitations"
+    YML_DIR = data_loader.PAGE_CONTENTS_PATH.joinpath(YML_FOLDER)
 
     # define default index as string for consistency with JSON keys
     DEFAULT_INDEX = "1"
@@ -21,11 +19,10 @@ def layout():
     sections = {}
     # Read files (order here won't matter anymore)
     for yml_file in YML_DIR.glob("*.yml"):
-        with open(yml_file, encoding="utf-8") as f:
-            data = yaml.safe_load(f) or {}
-            # normalize keys to strings; last write wins if duplicate keys appear
-            for k, v in data.items():
-                sections[str(k)] = v
+        data = data_loader.load_yml_file(YML_FOLDER, yml_file.name) or {}
+        # normalize keys to strings; last write wins if duplicate keys appear
+        for k, v in data.items():
+            sections[str(k)] = v
 
     # Fixed, deterministic order by numeric key (1, 2, 3)
     order = sorted(sections.keys(), key=lambda x: int(x))
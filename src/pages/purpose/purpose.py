@@ -1,9 +1,8 @@
 import dash
 from dash import html, dcc, callback, Output, Input, State
 import dash_bootstrap_components as dbc
-import yaml
 import json
-from pathlib import Path
+from utils import data_loader
 
 dash.register_page(__name__, path="/purpose")
 
@@ -22,18 +21,16 @@ def _norm(s: str) -> str:
 
 def layout():
     # --- define paths
-    YML_FOLDER = "../../assets/page_contents/section/purpose"
-    FILE_PATH = Path(__file__).parent
-    YML_DIR = FILE_PATH.joinpath(YML_FOLDER).resolve()
+    YML_FOLDER = "section/purpose"
+    YML_DIR = data_loader.PAGE_CONTENTS_PATH.joinpath(YML_FOLDER)
 
     # --- load and merge all YML files
     # Expected structure per YML: { "<key>": {"name": "...", "description": "..."} }
     merged = {}
     for yml_file in YML_DIR.glob("*.yml"):
-        with open(yml_file, encoding="utf-8") as f:
-            data = yaml.safe_load(f) or {}
-            # Last-in update wins, which is fine since we will reindex and sort deterministically
-            merged.update(data)
+        data = data_loader.load_yml_file(YML_FOLDER, yml_file.name) or {}
+        # Last-in update wins, which is fine since we will reindex and sort deterministically
+        merged.update(data)
 
     # --- convert to a list of sections and sort deterministically by SECTION_ORDER
     # We sort by the position of v["name"] in SECTION_ORDER (unknown names go to the end, alphabetical)
@@ -6,6 +6,7 @@ from urllib.parse import parse_qs
 import pandas as pd
 import numpy as np
 from utils import data_loader
+from utils import config_registry
 
 dash.register_page(__name__, path='/reports/customise-report')
 value_bg_color_mapping = {
@@ -101,14 +102,13 @@ def update_url(user_selection_completed, back, _next, restart, generate_report,
 	Input("exposure-sector-product-mapping-store", "data"),
 	State("customise-report-url", "search"),
 )
-def institution_type_radio(exposure_sector_product_mapping_dict, url_search):
+def institution_type_radio(config_version, url_search):
 	query = parse_qs(url_search.lstrip('?'))
 	report_type = query.get("report-type", [None])[0]
 	institutional_start_page = report_type == 'Institutional' and len(query) == 1
 
 	if institutional_start_page:
-		exposure_sector_product_mapping_df = pd.DataFrame(exposure_sector_product_mapping_dict)
-		unique_institution_types = [x for x in exposure_sector_product_mapping_df['institution'].unique() if x.upper() != 'ALL']
+		unique_institution_types = list(config_registry.get_institutions())
 		institution_selection = html.Div([
 			dbc.Label("Select one type of institution: "),
 			dbc.RadioItems(
@@ -135,11 +135,10 @@ def store_institution_type(value):
 	Output("stepper-content", "children"),
 	Output("exposure-type-store", "data", allow_duplicate=True),
 	Input("customise-report-url", "search"),
-	State("exposure-sector-product-mapping-store", "data"),
 	State('user-selection-completed-store', 'data'),
 	prevent_initial_call=True
 )
-def initiate_stepper(url_search, exposure_sector_product_mapping_dict, user_selection_completed):
+def initiate_stepper(url_search, user_selection_completed):
 	query = parse_qs(url_search.lstrip('?'))
 	report_type = query.get("report-type", [None])[0]
 	institution_type = query.get("institution-type", [None])[0]
@@ -152,10 +151,7 @@ def initiate_stepper(url_search, exposure_sector_product_mapping_dict, user_sele
 	# stepper children
 	stepper_children_styling = {"minWidth": "180px", "maxWidth": "220px", "overflow": "auto"}
 	if report_type == 'Institutional':
-		exposure_sector_product_mapping_df = data_loader.get_selected_institution_type_mapping(
-			exposure_sector_product_mapping_dict, institution_type
-		)
-		exposures = exposure_sector_product_mapping_df['exposure'].unique()
+		exposures = config_registry.get_institution_exposures(institution_type)
 		exposure_type = exposures[0] if len(exposures) > 0 else None
 		stepper_children = [
 			dmc.StepperStep(label=f"Step {i + 1}", description=f"{exposure}", style=stepper_children_styling)
@@ -200,7 +196,7 @@ def initiate_stepper(url_search, exposure_sector_product_mapping_dict, user_sele
 	State("customise-report-url", "search"),
 	prevent_initial_call=True
 )
-def update_stepper(exposure_sector_product_mapping_dict, back, _next, user_selection_completed, stepper_active, stepper_children, url_search):
+def update_stepper(config_version, back, _next, user_selection_completed, stepper_active, stepper_children, url_search):
 	query = parse_qs(url_search.lstrip('?'))
 	report_type = query.get("report-type", [None])[0]
 	institutional_start_page = report_type == 'Institutional' and len(query) == 1
@@ -237,7 +233,7 @@ def update_stepper(exposure_sector_product_mapping_dict, back, _next, user_selec
 	Input("all-user-selection-store", "data"),
 	Input("customise-report-url", "search"),
 )
-def initiate_exposure_selection_dropdown(exposure_sector_product_mapping_dict, exposure_type, user_selection_completed, stored_data, url_search):
+def initiate_exposure_selection_dropdown(config_version, exposure_type, user_selection_completed, stored_data, url_search):
 	query = parse_qs(url_search.lstrip('?'))
 	report_type = query.get("report-type", [None])[0]
 	institution_type = query.get("institution-type", [None])[0]
@@ -250,11 +246,10 @@ def initiate_exposure_selection_dropdown(exposure_sector_product_mapping_dict, e
 	stored_data = stored_data or {}
 	filtered_stored_data = stored_data.get(exposure_type, [])
 
-	exposure_sector_product_mapping_df = data_loader.get_selected_institution_type_mapping(exposure_sector_product_mapping_dict, institution_type)
-	exposure_sector_product_mapping_df = exposure_sector_product_mapping_df[exposure_sector_product_mapping_df['exposure'] == exposure_type]
-	sectors = exposure_sector_product_mapping_df['sector'].unique()
-	ptypes = exposure_sector_product_mapping_df['type'].unique()
-	combinations_to_keep_list = [(p, t) for p, t in exposure_sector_product_mapping_df[['sector', 'type']].drop_duplicates().values]
+	exposure_selection_options = config_registry.get_exposure_selection_options(institution_type, exposure_type)
+	sectors = exposure_selection_options['sectors']
+	ptypes = exposure_selection_options['types']
+	combinations_to_keep_list = exposure_selection_options['combinations']
 
 	table_styling = {
 		"margin": 8, "padding": 8, "align-items": "center", "verticalAlign": "middle", "width": "100%", "height": "100%",
@@ -324,7 +319,7 @@ def update_dropdown_color(user_selection_completed, values, current_styles, url_
 	State("customise-report-url", "search"),
 	State("all-user-selection-store", "data")
 )
-def initiate_sectors_checklist(exposure_sector_product_mapping_dict, exposure_type, user_selection_completed, url_search, stored_data):
+def initiate_sectors_checklist(config_version, exposure_type, user_selection_completed, url_search, stored_data):
 	query = parse_qs(url_search.lstrip('?'))
 	report_type = query.get("report-type", [None])[0]
 
@@ -336,21 +331,9 @@ def initiate_sectors_checklist(exposure_sector_product_mapping_dict, exposure_ty
 		stored_data = stored_data or {}
 		filtered_stored_data = stored_data.get("Sectors", [])
 
-		exposure_sector_product_mapping_df = pd.DataFrame(exposure_sector_product_mapping_dict)
-		exposure_sector_product_mapping_df['sector'] = [
-			next(iter(data_loader.load_yml_file('exposure_class', f'{sector_yml_file}.yml').values()))['name']
-			for sector_yml_file in exposure_sector_product_mapping_df['sector_yml_file']
-		]
-		exposure_sector_product_mapping_df['sector_group'] = exposure_sector_product_mapping_df['sector_yml_file'].str.split('/', expand=True)[0]
-		conditions_list = [
-			exposure_sector_product_mapping_df['sector_group'] == 'sector',
-			exposure_sector_product_mapping_df['sector_group'] == 'underwriting',
-			exposure_sector_product_mapping_df['sector_group'] == 'sovereigns'
-		]
-		choices_list = ['Sectors', 'Underwriting Classes', 'Sovereigns']
-		exposure_sector_product_mapping_df['sector_group'] = np.select(conditions_list, choices_list, default='Other')
-		exposure_sector_product_mapping_df = exposure_sector_product_mapping_df.sort_values(by=['sector'])
-		unique_sector_groups_and_sectors_df = exposure_sector_product_mapping_df[['sector_group', 'sector']].drop_duplicates()
+		sector_metadata_df = config_registry.get_sector_metadata_df()[['sector_group', 'name']].rename(columns={'name': 'sector'})
+		sector_metadata_df = sector_metadata_df.sort_values(by=['sector'], kind='stable')
+		unique_sector_groups_and_sectors_df = sector_metadata_df[['sector_group', 'sector']].drop_duplicates()
 
 		sectors_selection_checklists = []
 		sectors_selection_buttons = []
@@ -434,7 +417,7 @@ def sectors_checklist_select_or_clear_all(select_all, clear_all, ids, values, op
 	State("customise-report-url", "search"),
 	State("all-user-selection-store", "data")
 )
-def initiate_scenarios_checklist(scenario_mapping_dict, exposure_type, user_selection_completed, url_search, stored_data):
+def initiate_scenarios_checklist(config_version, exposure_type, user_selection_completed, url_search, stored_data):
 	query = parse_qs(url_search.lstrip('?'))
 	report_type = query.get("report-type", [None])[0]
 	institutional_start_page = report_type == 'Institutional' and len(query) == 1
@@ -447,7 +430,7 @@ def initiate_scenarios_checklist(scenario_mapping_dict, exposure_type, user_sele
 		stored_data = stored_data or {}
 		filtered_stored_data = stored_data.get("Scenarios", [])
 
-		scenario_mapping_df = pd.DataFrame(scenario_mapping_dict)
+		scenario_mapping_df = config_registry.get_config_df('scenario_mapping')
 		scenarios = scenario_mapping_df['scenario_name'].unique()
 
 		default_value = [x['value'] for x in filtered_stored_data] if filtered_stored_data else []
@@ -788,10 +771,9 @@ def store_user_selection_completed(_next, back, url_search, stepper_children, st
 	Input("all-user-selection-store", "data"),
 	Input('user-selection-completed-store', 'data'),
 	State("customise-report-url", "search"),
-	State("exposure-sector-product-mapping-store", "data"),
 	prevent_initial_call=True
 )
-def review_summary_page(_next, all_stored_data, user_selection_completed, url_search, exposure_sector_product_mapping_dict):
+def review_summary_page(_next, all_stored_data, user_selection_completed, url_search):
 	query = parse_qs(url_search.lstrip('?'))
 	report_type = query.get("report-type", [None])[0]
 	institution_type = query.get("institution-type", [None])[0]
@@ -807,10 +789,7 @@ def review_summary_page(_next, all_stored_data, user_selection_completed, url_se
 	# Reorder rows
 	if report_type == 'Institutional':
 		scenario_user_selection_df = all_user_selection_df[all_user_selection_df['exposure'] == 'Scenarios']
-		exposure_sector_product_mapping_df = pd.DataFrame(exposure_sector_product_mapping_dict)
-		exposure_sector_product_mapping_df = exposure_sector_product_mapping_df[
-			exposure_sector_product_mapping_df['institution'].isin([institution_type, 'All'])
-		]
+		exposure_sector_product_mapping_df = config_registry.get_institution_mapping_df(institution_type)
 		sort_order_df = exposure_sector_product_mapping_df[['exposure', 'sector', 'type']].drop_duplicates().rename(columns={'type': 'ptype'})
 		all_user_selection_df = pd.merge(sort_order_df, all_user_selection_df, on=['exposure', 'sector', 'ptype'], how='left')
 		all_user_selection_df = all_user_selection_df.dropna(subset='label')
@@ -1,9 +1,12 @@
 import dash
-from dash import html, dcc, callback, Output, Input, State
+from dash import html, dcc, callback, Output, Input, State, ALL
 from utils import data_loader
+from utils import config_registry
+from utils import report_cache
+from utils import report_download
+from utils import report_plan
 from utils import reports as reports_utils
 import pandas as pd
-import numpy as np
 from urllib.parse import parse_qs
 import dash_bootstrap_components as dbc
 
@@ -19,6 +22,12 @@ def layout(report_type=None, institution_type=None, **kwargs):
 						dbc.CardBody([
 							dbc.Button("Return to Selection", id="generate-report-previous-btn", color="light",
 									   className="w-100"),
+							*[
+								dbc.Button(f"Download {x['label']}", id={'type': 'report-download-btn', 'index': k},
+										   color="light", className="w-100")
+								for k, x in report_download.DOWNLOAD_FORMATS.items()
+							],
+							html.Div(id="report-download-status"),
 						], className="d-grid gap-3"),
 						className="mb-2 shadow"
 					),
@@ -55,7 +64,8 @@ def layout(report_type=None, institution_type=None, **kwargs):
 			),
 			dbc.Col(dcc.Loading(html.Div(id='report-content'), color="#00B050"), className="ms-22 pt-80"),
 		]),
-		dcc.Download(id="download-store"),
+		dcc.Store(id="report-download-store"),
+		dcc.Interval(id="report-download-interval", interval=1000, disabled=True),
 	], className="container")
 	return layout
 
@@ -101,15 +111,11 @@ def update_url(user_selection_completed, url_search, back, report_type, institut
 	Output("report-content", "children"),
 	Input("generate-report-url", "search"),
 	State("all-user-selection-store", "data"),
-	State("output-structure-mapping-store", "data"),
-	State("exposure-sector-product-mapping-store", "data"),
-	State("scenario-mapping-store", "data"),
 	State("report-type-store", "data"),
 	State("generate-report-url", "pathname"),
 	prevent_initial_call=True
 )
-def generate_all_reports(url_search, all_stored_data, output_structure_mapping_dict,
-						 exposure_sector_product_mapping_dict, scenario_mapping_dict, report_type, url_pathname):
+def generate_all_reports(url_search, all_stored_data, report_type, url_pathname):
 	if not url_pathname:
 		raise dash.exceptions.PreventUpdate
 
@@ -119,183 +125,117 @@ def generate_all_reports(url_search, all_stored_data, output_structure_mapping_d
 	if start_page:
 		raise dash.exceptions.PreventUpdate
 
-	# Initialise all dataframes
-	all_user_selection_df = pd.DataFrame()
-	for k, v in all_stored_data.items():
-		user_selection_df = pd.DataFrame(all_stored_data[k])
-		all_user_selection_df = pd.concat([all_user_selection_df, user_selection_df])
+	# Serve identical selections from the report cache
+	report_key = get_report_key(query, all_stored_data, report_type)
+	cached_report = report_cache.get_report(report_key)
+	if cached_report is not None:
+		return cached_report
 
-	scenario_mapping_df = pd.DataFrame(scenario_mapping_dict)
-	exposure_sector_product_mapping_df = pd.DataFrame(exposure_sector_product_mapping_dict)
-	output_structure_mapping_df = pd.DataFrame(output_structure_mapping_dict)
+	sidebar_layout, output_structure_layout = build_report(all_stored_data, report_type)
+	return report_cache.set_report(report_key, sidebar_layout, output_structure_layout)
 
-	# Extract scenario list if any
-	scenario_list = list(all_user_selection_df[all_user_selection_df['exposure'] == 'Scenarios']['label'].unique())
+@callback(
+	Output("report-download-store", "data"),
+	Output("report-download-interval", "disabled"),
+	Output("report-download-status", "children"),
+	Input({'type': 'report-download-btn', 'index': ALL}, "n_clicks"),
+	Input("report-download-interval", "n_intervals"),
+	State("report-download-store", "data"),
+	State("generate-report-url", "search"),
+	State("all-user-selection-store", "data"),
+	State("report-type-store", "data"),
+	prevent_initial_call=True
+)
+def download_report(n_clicks, n_intervals, download_format, url_search, all_stored_data, report_type):
+	# Start rendering on click, then poll until the file is ready; rendering happens in report_download's thread pool
+	triggered_id = dash.ctx.triggered_id
+	if isinstance(triggered_id, dict):
+		if not any(n_clicks):
+			raise dash.exceptions.PreventUpdate
+		download_format = triggered_id['index']
+	if not download_format or not url_search:
+		raise dash.exceptions.PreventUpdate
 
-	# Prepare output structure mapping
-	prepped_output_structure_df = prepare_output_structure_mapping(output_structure_mapping_df, report_type)
+	report_key = get_report_key(parse_qs(url_search.lstrip('?')), all_stored_data, report_type)
+	download_status = report_download.request_report_download(
+		report_key, download_format, lambda: build_report(all_stored_data, report_type)[1]
+	)
+	label = report_download.DOWNLOAD_FORMATS[download_format]['label']
+	extension = report_download.DOWNLOAD_FORMATS[download_format]['extension']
+	if download_status['status'] == 'pending':
+		return download_format, False, dbc.Spinner(html.Small(f"Preparing {label} report..."), size="sm", color="success")
+	if download_status['status'] == 'failed':
+		return None, True, dbc.Alert(f"The {label} report could not be created.", color="danger", className="mb-0 small")
+	return None, True, html.A(
+		dbc.Button(f"Save {label} report", color="success", className="w-100"),
+		href=download_status['url'], download=f"{report_type} Report.{extension}"
+	)
 
-	if report_type != 'Scenario':
-		# Get user selection with sector and product yml file path
-		prepped_user_selection_df = get_sector_and_product_yml_file_path(
-			all_user_selection_df, prepped_output_structure_df, exposure_sector_product_mapping_df, report_type
-		)
-	else:
-		prepped_user_selection_df = all_user_selection_df.copy()
+def get_report_key(query, all_stored_data, report_type):
+	return report_cache.get_report_key(
+		report_type, query.get('institution-type', [None])[0], all_stored_data,
+		config_registry.get_config_version(), data_loader.get_content_version()
+	)
 
-	# Get sort order
-	prepped_user_selection_df = sort_user_selections(prepped_user_selection_df, prepped_output_structure_df, report_type)
+def build_report(all_stored_data, report_type):
+	# Compile the report plan
+	plan = report_plan.compile_report_plan(all_stored_data, report_type)
+	scenario_mapping_df = config_registry.get_config_df('scenario_mapping')
+	scenario_list = plan['scenarios']
 
 	# Output structure
+	sections = list(dict.fromkeys(x['output_structure'] for x in plan['output_structure']))
+	# Sector Overview and Sector Detail are combined into one Sector Detail section, grouped by sector
+	sector_detail_flag = 'Sector Overview' in sections and 'Sector Detail' in sections
 	output_structure_layout = []
-	for section in prepped_output_structure_df['output_structure'].unique():
+	for section in sections:
+		if sector_detail_flag and section == 'Sector Overview':
+			output_structure_layout.append(get_sector_detail_layout(
+				plan['selections'], plan['output_structure'], scenario_mapping_df, scenario_list
+			))
+			continue
+		if sector_detail_flag and section == 'Sector Detail':
+			continue
 		section_layout = []
-		section_mapping_df = prepped_output_structure_df[prepped_output_structure_df['output_structure'] == section]
-		for sub_section in section_mapping_df['sub_section'].unique():
-			sub_section_mapping_df = section_mapping_df[section_mapping_df['sub_section'] == sub_section]
+		section_plan = [x for x in plan['output_structure'] if x['output_structure'] == section]
+		for sub_section in dict.fromkeys(x['sub_section'] for x in section_plan):
+			sub_section_plan = [x for x in section_plan if x['sub_section'] == sub_section]
 			if sub_section == 'summary_input_table_flag':
-				sub_section_layout = get_summary_input_table_layout(all_user_selection_df, prepped_user_selection_df)
+				sub_section_layout = get_summary_input_table_layout(plan['user_selections'], plan['selections'])
 			elif sub_section == 'scenario_content_id':
-				sub_section_layout = get_scenario_layout(sub_section_mapping_df, scenario_mapping_df, scenario_list)
+				sub_section_layout = get_scenario_layout(sub_section_plan, scenario_mapping_df, scenario_list)
 			elif sub_section == 'sector_description_content_id':
-				filtered_user_selection_with_yml_file_path_df = reports_utils.filter_user_selection_by_section(
-					prepped_user_selection_df, section, sub_section
+				sub_section_layout = get_sector_description_layout(
+					report_plan.filter_plan_by_section(plan['selections'], section, sub_section)
 				)
-				sub_section_layout = get_sector_description_layout(filtered_user_selection_with_yml_file_path_df)
 			elif sub_section == 'sector_scenario_content_id':
-				filtered_user_selection_with_yml_file_path_df = reports_utils.filter_user_selection_by_section(
-					prepped_user_selection_df, section, sub_section
-				)
 				sub_section_layout = get_sector_scenario_layout(
-					filtered_user_selection_with_yml_file_path_df, scenario_mapping_df, scenario_list, report_type
+					report_plan.filter_plan_by_section(plan['selections'], section, sub_section),
+					scenario_mapping_df, scenario_list, report_type
 				)
 			elif sub_section == 'product_content_id':
-				filtered_user_selection_with_yml_file_path_df = reports_utils.filter_user_selection_by_section(
-					prepped_user_selection_df, section, sub_section
+				sub_section_layout = get_product_text_layout(
+					report_plan.filter_plan_by_section(plan['selections'], section, sub_section)
 				)
-				sub_section_layout = get_product_text_layout(filtered_user_selection_with_yml_file_path_df)
 			else:
 				sub_section_layout = []
 			section_layout.append(sub_section_layout)
 		section_layout = html.Div([html.H1(section)] + section_layout)
 		output_structure_layout.append(section_layout)
-	output_structure_layout = remove_parents_with_empty_children(output_structure_layout)
-	if report_type != 'Scenario':
-		output_structure_layout = clean_up_sector_overview_and_detail(output_structure_layout, prepped_output_structure_df)
+	output_structure_layout, nav_groups = transform_report_content(output_structure_layout)
 
-	output_structure_layout, sidebar_layout = create_sidebar_layout(output_structure_layout)
+	sidebar_layout = create_sidebar_layout(nav_groups)
 	return html.Div(sidebar_layout), html.Div(output_structure_layout)
 
-def prepare_output_structure_mapping(output_structure_mapping_df, report_type):
-	exploded_df = output_structure_mapping_df[output_structure_mapping_df['report_type'] == report_type].copy()
-
-	if report_type != 'Scenario':
-		exploded_df['materiality'] = [
-			['High', 'Medium', 'Low'] if x == 'All' else [x] for x in exploded_df['materiality']
-		]
-		exploded_df = exploded_df.explode(['materiality'])
-		exploded_df['materiality'] = pd.Categorical(
-			exploded_df['materiality'], categories=['High', 'Medium', 'Low'], ordered=True
-		)
-	exploded_df['output_structure'] = pd.Categorical(
-		exploded_df['output_structure'], categories=exploded_df['output_structure'].drop_duplicates(), ordered=True
-	)
-
-	id_list = ['report_type', 'output_structure', 'materiality']
-	sort_order_df = exploded_df[id_list].drop_duplicates().sort_values(by=id_list)
-
-	melted_df = pd.melt(exploded_df, id_vars=id_list, var_name='sub_section', value_name='content_id')
-	melted_df = melted_df[~melted_df['content_id'].isnull()]
-	sorted_df = pd.merge(sort_order_df, melted_df, on=id_list, how='left')
-	sorted_df = sorted_df.dropna(subset=['content_id']).reset_index(drop=True).reset_index(names='sort_order')
-	return sorted_df
-
-def get_sector_and_product_yml_file_path(all_user_selection_df, output_structure_mapping_df, exposure_sector_product_mapping_df, report_type):
-	user_selection_df = all_user_selection_df[all_user_selection_df['exposure'] != 'Scenarios'].copy()
-	if report_type == 'Institutional':
-		user_selection_df = user_selection_df.rename(columns={
-			'label': 'materiality',
-			'ptype': 'type',
-		})
-		user_selection_df = user_selection_df.drop(columns=['id', 'value'])
-
-		# Merge in exposure-sector-product mapping to get yml file
-		sovereign_user_selection_df = user_selection_df[user_selection_df['exposure'] == 'Sovereigns']
-		sovereign_user_selection_with_mapping_df = pd.merge(
-			sovereign_user_selection_df, exposure_sector_product_mapping_df.drop(columns=['institution', 'type']),
-			on=['exposure', 'sector'], how='left'
-		)
-		other_user_selection_df = user_selection_df[user_selection_df['exposure'] != 'Sovereigns']
-		other_user_selection_with_mapping_df = pd.merge(
-			other_user_selection_df, exposure_sector_product_mapping_df, on=['institution', 'exposure', 'sector', 'type'], how='left'
-		)
-		user_selection_with_mapping_df = pd.concat([sovereign_user_selection_with_mapping_df, other_user_selection_with_mapping_df])
-		user_selection_with_mapping_df = user_selection_with_mapping_df[user_selection_with_mapping_df['materiality'] != 'N/A']
-	else:
-		exposure_sector_product_mapping_df['yml_sector'] = [
-			next(iter(data_loader.load_yml_file('exposure_class', f'{sector_yml_file}.yml').values()))['name']
-			for sector_yml_file in exposure_sector_product_mapping_df['sector_yml_file']
-		]
-		user_selection_df = user_selection_df[['exposure', 'sector', 'label']].rename(columns={'sector': 'yml_sector'})
-		exposure_sector_product_mapping_df = exposure_sector_product_mapping_df[['yml_sector', 'sector_yml_file']].drop_duplicates()
-		user_selection_with_mapping_df = pd.merge(user_selection_df, exposure_sector_product_mapping_df, on=['yml_sector'], how='inner')
-		user_selection_with_mapping_df = user_selection_with_mapping_df.drop(columns=['yml_sector'])
-		user_selection_with_mapping_df = user_selection_with_mapping_df.rename(columns={'label': 'materiality'})
-
-	# Merge in output structure mapping to get content_id
-	output_df = pd.merge(
-		user_selection_with_mapping_df, output_structure_mapping_df, on=['materiality'], how='left'
-	)
-	return output_df
-
-def sort_user_selections(all_user_selection_df, output_structure_mapping_df, report_type):
-	output_df = all_user_selection_df.copy()
-
-	if report_type == 'Scenario':
-		output_df = output_df.rename(columns={
-			'report': 'report_type',
-			'label': 'scenario',
-		})
-		output_df = output_df[['report_type', 'scenario']]
-		output_df = pd.merge(output_structure_mapping_df, output_df, on=['report_type'], how='left')
-
-		# Get sort order
-		sort_variables_list = ['sort_order']
-	else:
-		# Get sector name
-		output_df['yml_sector'] = [
-			next(iter(data_loader.load_yml_file('exposure_class', f'{sector_yml_file}.yml').values()))['name']
-			for sector_yml_file in output_df['sector_yml_file']
-		]
-		output_df['yml_sector'] = np.where(
-			output_df['yml_sector'].str.lower().str.contains('sovereign'), 'Sovereigns', output_df['yml_sector']
-		)
-
-		# Get sort order
-		if report_type == 'Institutional':
-			output_df['sector_sort_order'] = [
-				next(iter(data_loader.load_yml_file('exposure_class', f'{sector_yml_file}.yml')))
-				for sector_yml_file in output_df['sector_yml_file']
-			]
-			sort_variables_list = ['sort_order', 'sector_sort_order', 'materiality']
-		else:
-			sort_order_df = output_df[['yml_sector']].drop_duplicates().sort_values(by='yml_sector')
-			sort_order_df = sort_order_df.reset_index(drop=True).reset_index(names='sector_sort_order')
-			output_df = pd.merge(sort_order_df, output_df, on='yml_sector', how='left')
-			sort_variables_list = ['sector_sort_order']
-
-	# Sort by key variables
-	sorted_df = output_df.sort_values(by=sort_variables_list)
-	return sorted_df
-
-def get_summary_input_table_layout(all_user_selection_df, prepped_user_selection_df):
+def get_summary_input_table_layout(user_selection_records, selection_plan):
+	all_user_selection_df = pd.DataFrame(user_selection_records)
 	scenario_user_selection_df = all_user_selection_df[all_user_selection_df['exposure'] == 'Scenarios'].copy()
 	scenario_user_selection_df = scenario_user_selection_df.rename(columns={
 		'report': 'report_type',
 		'label': 'materiality',
 		'ptype': 'type',
 	})
-	summary_input_df = pd.concat([prepped_user_selection_df, scenario_user_selection_df])
+	summary_input_df = pd.concat([pd.DataFrame(selection_plan), scenario_user_selection_df])
 
 	summary_input_table = data_loader.rename_user_selection_data_columns(summary_input_df).drop_duplicates()
 	summary_input_table_layout = html.Div([
@@ -304,9 +244,9 @@ def get_summary_input_table_layout(all_user_selection_df, prepped_user_selection
 	])
 	return summary_input_table_layout
 
-def get_scenario_layout(sub_section_mapping_df, scenario_mapping_df, scenario_list):
-	section = sub_section_mapping_df['output_structure'].iloc[0]
-	content_id = sub_section_mapping_df['content_id'].iloc[0]
+def get_scenario_layout(sub_section_plan, scenario_mapping_df, scenario_list):
+	section = sub_section_plan[0]['output_structure']
+	content_id = sub_section_plan[0]['content_id']
 	all_desc = []
 	if len(scenario_list) == 0:
 		scenario_layout = html.Div(className='d-none')
@@ -334,33 +274,32 @@ def get_scenario_layout(sub_section_mapping_df, scenario_mapping_df, scenario_li
 		scenario_layout = html.Div([*header_layout, *all_desc])
 	return scenario_layout
 
-def get_sector_scenario_layout(user_selection_with_yml_file_path_df, scenario_mapping_df, scenario_list, report_type):
-	section = user_selection_with_yml_file_path_df['output_structure'].iloc[0]
+def get_sector_scenario_layout(selection_plan, scenario_mapping_df, scenario_list, report_type):
+	section = selection_plan[0]['output_structure']
 
-	# Split by materiality
-	high_materiality_df = user_selection_with_yml_file_path_df[user_selection_with_yml_file_path_df['materiality'] == 'High'].copy()
-	high_materiality_df = high_materiality_df[['sector_yml_file', 'content_id', 'materiality']].drop_duplicates()
-	low_medium_materiality_df = user_selection_with_yml_file_path_df[user_selection_with_yml_file_path_df['materiality'].isin(['Low', 'Medium'])].copy()
-	low_medium_materiality_df = low_medium_materiality_df[['sector_yml_file', 'content_id', 'materiality']].drop_duplicates()
+	# Split by materiality into unique (sector_yml_file, content_id, materiality)
+	high_materiality_plan = list(dict.fromkeys(
+		(x['sector_yml_file'], x['content_id'], x['materiality']) for x in selection_plan if x['materiality'] == 'High'
+	))
+	low_medium_materiality_plan = list(dict.fromkeys(
+		(x['sector_yml_file'], x['content_id'], x['materiality']) for x in selection_plan if x['materiality'] in ['Low', 'Medium']
+	))
 
-	if len(scenario_list) == 0:
+	# Sector narratives of the Sector Detail section are built per sector by get_sector_detail_layout
+	if len(scenario_list) == 0 or section != 'Executive Summary':
 		sector_scenario_layout = html.Div(className='d-none')
 	else:
 		# High materiality section
-		if len(high_materiality_df) == 0:
+		if len(high_materiality_plan) == 0:
 			high_materiality_layout = html.Div(className='d-none')
-			high_materiality_other_desc = []
-			high_materiality_sovereign_desc = []
 		else:
 			high_materiality_sovereign_desc = []
 			high_materiality_other_desc = []
-			for sector_yml_file in high_materiality_df['sector_yml_file'].unique():
-				sector_selection_df = high_materiality_df[high_materiality_df['sector_yml_file'] == sector_yml_file]
-				sector_yml_file = sector_selection_df['sector_yml_file'].iloc[0]
+			for sector_yml_file in dict.fromkeys(x[0] for x in high_materiality_plan):
 				sector_yml = data_loader.load_yml_file('exposure_class', f'{sector_yml_file}.yml')
 				sector_yml = next(iter(sector_yml.values()))
 				sector_name = sector_yml['name']
-				content_id_list = list(sector_selection_df['content_id'].unique())
+				content_id_list = list(dict.fromkeys(x[1] for x in high_materiality_plan if x[0] == sector_yml_file))
 				content_id_list = sorted(content_id_list, key=lambda x: ['always', 'high_materiality'].index(x))
 				scenario_desc = []
 				for scenario in scenario_list:
@@ -368,20 +307,13 @@ def get_sector_scenario_layout(user_selection_with_yml_file_path_df, scenario_ma
 						header = [html.H6(scenario)]
 					else:
 						header = [html.H5(scenario)]
-					content_desc = []
-					for content_id in content_id_list:
-						if section == 'Sector Detail':
-							if content_id == 'always':
-								sub_header = [dcc.Markdown('**Summary**')]
-							else:
-								sub_header = [dcc.Markdown('**Detail**')]
-						else:
-							sub_header = []
-						content = [dcc.Markdown(
+					content_desc = [
+						html.Div([dcc.Markdown(
 							reports_utils.filter_yml_by_scenario(sector_yml, scenario, scenario_mapping_df)[content_id],
 							link_target="_blank", dangerously_allow_html=True, className='display-12', style={'textTransform': 'none'}
-						)]
-						content_desc.append(html.Div(sub_header + content))
+						)])
+						for content_id in content_id_list
+					]
 					scenario_desc.append(html.Div(header + content_desc, className='mb-3'))
 				if 'sovereign' in sector_name.lower():
 					sector_div = html.Div([html.H5(sector_name), *scenario_desc])
@@ -390,8 +322,7 @@ def get_sector_scenario_layout(user_selection_with_yml_file_path_df, scenario_ma
 					sector_div = html.Div([html.H4(sector_name), *scenario_desc])
 					high_materiality_other_desc.append(sector_div)
 			high_materiality_layout = html.Div([
-				html.H3('High materiality exposures') if section == 'Executive Summary' and report_type != 'Sector'
-					else html.Div([], className='d-none'),
+				html.H3('High materiality exposures') if report_type != 'Sector' else html.Div([], className='d-none'),
 				*high_materiality_other_desc,
 				html.Div([
 					html.H4('Sovereigns'),
@@ -400,322 +331,290 @@ def get_sector_scenario_layout(user_selection_with_yml_file_path_df, scenario_ma
 			])
 
 		# Low and Medium materiality section
-		if len(low_medium_materiality_df) == 0:
+		if len(low_medium_materiality_plan) == 0:
 			low_medium_materiality_layout = html.Div([], className='d-none')
-			low_medium_materiality_other_desc = []
-			low_medium_materiality_sovereign_desc = []
-		else:
-			low_medium_materiality_sovereign_desc = []
-			low_medium_materiality_other_desc = []
-			if section == 'Executive Summary':
-				# Combine materiality
-				low_medium_materiality_df = reports_utils.convert_to_bullet_points(low_medium_materiality_df, 'materiality')
-
-				# Add scenarios
-				low_medium_materiality_df['scenario'] = [scenario_list for x in low_medium_materiality_df['sector_yml_file']]
-				low_medium_materiality_df = low_medium_materiality_df.explode('scenario')
-
-				# Add sector yml
-				low_medium_materiality_df['sector_yml'] = [
-					next(iter(data_loader.load_yml_file('exposure_class', f'{sector_yml_file}.yml').values()))
-					for sector_yml_file in low_medium_materiality_df['sector_yml_file']
-				]
-				low_medium_materiality_df['sector'] = [
-					sector_yml['name'] for sector_yml in low_medium_materiality_df['sector_yml']
-				]
-
-				# Add description
-				low_medium_materiality_df['description'] = [
-					reports_utils.filter_yml_by_scenario(sector_yml, scenario, scenario_mapping_df)[content_id]
-					for sector_yml, scenario, content_id in low_medium_materiality_df[['sector_yml', 'scenario', 'content_id']].to_numpy()
-				]
-
-				# Create datatable
-				low_medium_materiality_table = data_loader.rename_user_selection_data_columns(low_medium_materiality_df)
-				low_medium_materiality_table = data_loader.create_data_table(low_medium_materiality_table, ['Materiality'], ['Description'])
-
-				low_medium_materiality_layout = html.Div([
-					html.H3('Other exposures'),
-					html.Div(low_medium_materiality_table)
-				])
-			elif section == 'Sector Detail':
-				low_medium_materiality_sovereign_desc = []
-				low_medium_materiality_other_desc = []
-				for sector_yml_file in low_medium_materiality_df['sector_yml_file'].unique():
-					sector_selection_df = low_medium_materiality_df[low_medium_materiality_df['sector_yml_file'] == sector_yml_file]
-					sector_yml_file = sector_selection_df['sector_yml_file'].iloc[0]
-					sector_yml = data_loader.load_yml_file('exposure_class', f'{sector_yml_file}.yml')
-					sector_yml = next(iter(sector_yml.values()))
-					content_id = sector_selection_df['content_id'].iloc[0]
-					scenario_desc = [
-						html.Div([
-							html.H5(scenario),
-							dcc.Markdown(
-								reports_utils.filter_yml_by_scenario(sector_yml, scenario, scenario_mapping_df)[content_id],
-								link_target="_blank", dangerously_allow_html=True, className='display-12', style={'textTransform': 'none'}
-							)
-						]) for scenario in scenario_list
-					]
-					sector_name = sector_yml['name']
-					if 'sovereign' in sector_name.lower():
-						sector_div = html.Div([html.H5(sector_name), *scenario_desc])
-						low_medium_materiality_sovereign_desc.append(sector_div)
-					else:
-						sector_div = html.Div([html.H4(sector_name), *scenario_desc])
-						low_medium_materiality_other_desc.append(sector_div)
-				low_medium_materiality_layout = html.Div([
-					*low_medium_materiality_other_desc,
-					html.Div([
-						html.H4('Sovereigns') if len(low_medium_materiality_sovereign_desc) > 0 else [],
-						*low_medium_materiality_sovereign_desc
-					]),
-				])
-			else:
-				low_medium_materiality_layout = html.Div(className='d-none')
-
-		if section == 'Executive Summary':
-			sector_scenario_layout = html.Div([
-				html.H2(f'Summary of Exposure{data_loader.plural_add_s(len(user_selection_with_yml_file_path_df) > 0)}'),
-				html.P(f'This report considers the following exposure'
-					   f'{data_loader.plural_add_s(len(user_selection_with_yml_file_path_df) > 0)}:'),
-				high_materiality_layout,
-				low_medium_materiality_layout
-			])
-		elif section == 'Sector Detail':
-			sector_list = []
-			other_desc = []
-			for desc in high_materiality_other_desc:
-				if hasattr(desc, 'children'):
-					sector_name = desc.children[0].children
-					sector_list.append(sector_name)
-					other_desc.append(desc)
-
-			for desc in low_medium_materiality_other_desc:
-				if hasattr(desc, 'children'):
-					sector_name = desc.children[0].children
-					if sector_name not in sector_list:
-						sector_list.append(sector_name)
-						other_desc.append(desc)
-
-			sector_scenario_layout = html.Div([
-				*other_desc,
-				html.Div([
-					html.H4('Sovereigns', className='fw-bold'),
-					*high_materiality_sovereign_desc,
-					*low_medium_materiality_sovereign_desc,
-				])
-			])
 		else:
-			sector_scenario_layout = html.Div(className='d-none')
-	return sector_scenario_layout
+			# Combine materiality
+			low_medium_materiality_df = pd.DataFrame(
+				low_medium_materiality_plan, columns=['sector_yml_file', 'content_id', 'materiality']
+			)
+			low_medium_materiality_df = reports_utils.convert_to_bullet_points(low_medium_materiality_df, 'materiality')
 
-def get_sector_description_layout(user_selection_with_yml_file_path_df):
-	# Split by sovereign and other sectors
-	sovereign_sector_selection_df = user_selection_with_yml_file_path_df[
-		user_selection_with_yml_file_path_df['exposure'] == 'Sovereigns'
-	].copy()
-	other_sector_selection_df = user_selection_with_yml_file_path_df[
-		user_selection_with_yml_file_path_df['exposure'] != 'Sovereigns'
-	].copy()
-
-	all_sector_desc = []
-	for sector_selection_df in [other_sector_selection_df, sovereign_sector_selection_df]:
-		if len(sector_selection_df) == 0:
-			continue
-		else:
-			# Get unique sector yml files without materiality
-			sector_selection_df = sector_selection_df[['sector_yml_file', 'content_id']].drop_duplicates()
+			# Add scenarios
+			low_medium_materiality_df['scenario'] = [scenario_list for x in low_medium_materiality_df['sector_yml_file']]
+			low_medium_materiality_df = low_medium_materiality_df.explode('scenario')
 
 			# Add sector yml
-			sector_selection_df['sector_yml'] = [
+			low_medium_materiality_df['sector_yml'] = [
 				next(iter(data_loader.load_yml_file('exposure_class', f'{sector_yml_file}.yml').values()))
-				for sector_yml_file in sector_selection_df['sector_yml_file']
+				for sector_yml_file in low_medium_materiality_df['sector_yml_file']
 			]
-			sector_selection_df['sector'] = [
-                'Sovereigns' if 'sovereign' in sector_yml['name'].lower() else sector_yml['name']
-                for sector_yml in sector_selection_df['sector_yml']
-            ]
+			low_medium_materiality_df['sector'] = low_medium_materiality_df['sector_yml_file'].map(
+				config_registry.get_sector_metadata_df()['name']
+			)
 
 			# Add description
-			sector_selection_df['description'] = [
-				sector_yml.get(content_id, "")
-				for sector_yml, content_id in sector_selection_df[['sector_yml', 'content_id']].to_numpy()
+			low_medium_materiality_df['description'] = [
+				reports_utils.filter_yml_by_scenario(sector_yml, scenario, scenario_mapping_df)[content_id]
+				for sector_yml, scenario, content_id in low_medium_materiality_df[['sector_yml', 'scenario', 'content_id']].to_numpy()
 			]
 
-			# Create layout
-			sector_selection_df = sector_selection_df[['sector', 'description']].drop_duplicates()
-			sector_desc = [
-				html.Div([
-					html.H5(sector),
-					dcc.Markdown(description, link_target="_blank", dangerously_allow_html=True, className='display-12', style={'textTransform': 'none'})
-				]) if description != "" else html.Div(className='d-none')
-				for sector, description in sector_selection_df[['sector', 'description']].to_numpy()
-			]
-			all_sector_desc += sector_desc
-	sector_layout = html.Div([*all_sector_desc]) if len(all_sector_desc) > 0 else html.Div(className='d-none')
-	return sector_layout
+			# Create datatable
+			low_medium_materiality_table = data_loader.rename_user_selection_data_columns(low_medium_materiality_df)
+			low_medium_materiality_table = data_loader.create_data_table(low_medium_materiality_table, ['Materiality'], ['Description'])
 
-def get_product_text_layout(user_selection_with_yml_file_path_df):
-	product_selection_df = user_selection_with_yml_file_path_df.copy()
+			low_medium_materiality_layout = html.Div([
+				html.H3('Other exposures'),
+				html.Div(low_medium_materiality_table)
+			])
 
-	if len(product_selection_df) == 0:
-		product_layout = html.Div(className='d-none')
-	else:
-		# Drop materiality
-		product_selection_df = product_selection_df.drop(columns='materiality').drop_duplicates()
+		sector_scenario_layout = html.Div([
+			html.H2(f'Summary of Exposure{data_loader.plural_add_s(len(selection_plan) > 0)}'),
+			html.P(f'This report considers the following exposure'
+				   f'{data_loader.plural_add_s(len(selection_plan) > 0)}:'),
+			high_materiality_layout,
+			low_medium_materiality_layout
+		])
+	return sector_scenario_layout
+
+def get_sector_descriptions(selection_plan):
+	sector_metadata = config_registry.get_sector_metadata_df()['sector'].to_dict()
+
+	all_sector_descriptions = []
+	# Other sectors first, then sovereigns
+	for sovereign_flag in [False, True]:
+		# Get unique sector yml files without materiality
+		sector_selection_plan = dict.fromkeys(
+			(x['sector_yml_file'], x['content_id']) for x in selection_plan if (x['exposure'] == 'Sovereigns') == sovereign_flag
+		)
 
-		# Change ptype to sector if it's Exposure
-		product_selection_df['type'] = np.where(
-			product_selection_df['type'] == 'Exposure', product_selection_df['sector'], product_selection_df['type']
+		# Add sector name and description
+		all_sector_descriptions += dict.fromkeys(
+			(
+				sector_metadata[sector_yml_file],
+				next(iter(data_loader.load_yml_file('exposure_class', f'{sector_yml_file}.yml').values())).get(content_id, "")
+			)
+			for sector_yml_file, content_id in sector_selection_plan
 		)
+	return all_sector_descriptions
+
+def get_sector_description_layout(selection_plan):
+	sector_desc = [
+		html.Div([
+			html.H5(sector),
+			dcc.Markdown(description, link_target="_blank", dangerously_allow_html=True, className='display-12', style={'textTransform': 'none'})
+		]) if description != "" else html.Div(className='d-none')
+		for sector, description in get_sector_descriptions(selection_plan)
+	]
+	sector_layout = html.Div([*sector_desc]) if len(sector_desc) > 0 else html.Div(className='d-none')
+	return sector_layout
 
-		# Add product yml
-		product_selection_df['product_yml'] = [
-			next(iter(data_loader.load_yml_file('product', f'{product_yml_file}.yml').values()))
-			for product_yml_file in product_selection_df['product_yml_file']
-		]
-
-		# Add product name
-		product_selection_df['product'] = [
-			product_yml['description'] for product_yml in product_selection_df['product_yml']
-		]
-
-		# Add sector yml
-		product_selection_df['sector_yml'] = [
-			next(iter(data_loader.load_yml_file('exposure_class', f'{sector_yml_file}.yml').values()))
-			for sector_yml_file in product_selection_df['sector_yml_file']
-		]
-		product_selection_df['sector'] = [
-			'Sovereigns' if 'sovereign' in sector_yml['name'].lower() else sector_yml['name']
-			for sector_yml in product_selection_df['sector_yml']
-		]
-
-		# Add description
-		product_selection_df['description'] = [
-			product_yml[content_id]
-			for product_yml, content_id in product_selection_df[['product_yml', 'content_id']].to_numpy()
-		]
-
-		# Combine type
-		product_selection_table = product_selection_df[['sector', 'product', 'type', 'description']].drop_duplicates()
-		product_selection_table = reports_utils.convert_to_bullet_points(product_selection_table, 'type')
-
-		# Create datatable
-		product_selection_table = data_loader.rename_user_selection_data_columns(product_selection_table)
-		product_selection_table = data_loader.create_data_table(product_selection_table, ['Type'], ['Description'])
+def get_product_table(selection_plan):
+	sector_metadata = config_registry.get_sector_metadata_df()['sector'].to_dict()
+	product_selection_records = []
+	for x in selection_plan:
+		product_yml = next(iter(data_loader.load_yml_file('product', f'{x["product_yml_file"]}.yml').values()))
+		product_selection_records.append({
+			'sector': sector_metadata.get(x['sector_yml_file']),
+			'product': product_yml['description'],
+			# Change ptype to sector if it's Exposure
+			'type': x['sector'] if x['type'] == 'Exposure' else x['type'],
+			'description': product_yml[x['content_id']],
+		})
 
+	# Combine type
+	product_selection_table = pd.DataFrame(
+		product_selection_records, columns=['sector', 'product', 'type', 'description']
+	).drop_duplicates()
+	product_selection_table = reports_utils.convert_to_bullet_points(product_selection_table, 'type')
+	return data_loader.rename_user_selection_data_columns(product_selection_table)
+
+def get_product_text_layout(selection_plan):
+	if len(selection_plan) == 0:
+		product_layout = html.Div(className='d-none')
+	else:
+		product_selection_table = data_loader.create_data_table(get_product_table(selection_plan), ['Type'], ['Description'])
 		product_layout = html.Div([
 			html.P('The following rows contribute:'),
 			html.Div(product_selection_table)
 		])
 	return product_layout
 
-def remove_parents_with_empty_children(report_content):
-	if not isinstance(report_content, (list, tuple)):
-		return report_content
+def get_sector_scenario_detail_layouts(selection_plan, scenario_mapping_df, scenario_list):
+	"""
+	Return the scenario narratives of each sector for the Sector Detail section, keyed by sector name.
+	High materiality sectors get a Summary and Detail per scenario; all sovereigns are combined under 'Sovereigns'.
+	"""
+	high_materiality_plan = list(dict.fromkeys(
+		(x['sector_yml_file'], x['content_id']) for x in selection_plan if x['materiality'] == 'High'
+	))
+	low_medium_materiality_plan = list(dict.fromkeys(
+		(x['sector_yml_file'], x['content_id']) for x in selection_plan if x['materiality'] in ['Low', 'Medium']
+	))
+
+	sector_layouts = {}
+	sovereign_layout = []
+	for materiality_plan, high_materiality_flag in [(high_materiality_plan, True), (low_medium_materiality_plan, False)]:
+		for sector_yml_file in dict.fromkeys(x[0] for x in materiality_plan):
+			sector_yml = next(iter(data_loader.load_yml_file('exposure_class', f'{sector_yml_file}.yml').values()))
+			sector_name = sector_yml['name']
+			content_id_list = list(dict.fromkeys(x[1] for x in materiality_plan if x[0] == sector_yml_file))
+			if high_materiality_flag:
+				content_id_list = sorted(content_id_list, key=lambda x: ['always', 'high_materiality'].index(x))
+			else:
+				content_id_list = content_id_list[:1]
+
+			# Sovereigns sit one heading level below the other sectors
+			sovereign_flag = 'sovereign' in sector_name.lower()
+			scenario_header, content_header = (html.H4, html.H5) if sovereign_flag else (html.H3, html.H4)
+			scenario_layout = []
+			for scenario in scenario_list:
+				scenario_yml = reports_utils.filter_yml_by_scenario(sector_yml, scenario, scenario_mapping_df)
+				scenario_layout.append(scenario_header(scenario))
+				for content_id in content_id_list:
+					if high_materiality_flag:
+						scenario_layout.append(content_header('Summary' if content_id == 'always' else 'Detail'))
+					scenario_layout.append(dcc.Markdown(
+						scenario_yml[content_id],
+						link_target="_blank", dangerously_allow_html=True, className='display-12', style={'textTransform': 'none'}
+					))
+
+			if sovereign_flag:
+				sovereign_layout += [html.H3(sector_name), *scenario_layout]
+			elif sector_name not in sector_layouts:
+				sector_layouts[sector_name] = scenario_layout
+	if len(sovereign_layout) > 0:
+		sector_layouts['Sovereigns'] = sovereign_layout
+	return sector_layouts
+
+def get_sector_detail_layout(selection_plan, output_structure_plan, scenario_mapping_df, scenario_list):
+	"""
+	Build the Sector Detail section from the Sector Overview and Sector Detail selections,
+	with one sub section per described sector holding its description, product rows and scenario narratives.
+	"""
+	sector_descriptions = get_sector_descriptions(
+		report_plan.filter_plan_by_section(selection_plan, 'Sector Overview', 'sector_description_content_id')
+	)
+	sector_scenario_layouts = get_sector_scenario_detail_layouts(
+		report_plan.filter_plan_by_section(selection_plan, 'Sector Detail', 'sector_scenario_content_id'),
+		scenario_mapping_df, scenario_list
+	)
 
-	updated_children = []
-	for node in report_content:
-		if hasattr(node, 'children'):
-			new_children = remove_parents_with_empty_children(node.children)
-			if new_children:
-				updated_node = node.__class__(new_children, **{k: v for k, v in node.__dict__.items() if k in ['className', 'style', 'id']})
-				updated_children.append(updated_node)
-		else:
-			updated_children.append(node)
-	updated_children = [c for c in updated_children if c is not None and c != [] and c != '']
-	if updated_children:
-		if hasattr(updated_children[0], 'children'):
-			if (len(updated_children) == 1 and hasattr(updated_children[0], '__class__')
-					and updated_children[0].__class__.__name__ in {'H1', 'H2', 'H3', 'H4', 'H5', 'H6'}):
-				updated_children = []
-	return updated_children
-
-def clean_up_sector_overview_and_detail(report_content, output_structure_df):
-	# Get sector overview and detail layout and its index
-	sector_overview_mapping = {i: x for i, x in enumerate(report_content) if x.children[0].children == 'Sector Overview'}
-	sector_overview_index = next(iter(sector_overview_mapping.keys()))
-	sector_overview_layout = next(iter(sector_overview_mapping.values()))
-	sector_detail_mapping = {i: x for i, x in enumerate(report_content) if x.children[0].children == 'Sector Detail'}
-	sector_detail_index = next(iter(sector_detail_mapping.keys()))
-	sector_detail_layout = next(iter(sector_detail_mapping.values()))
-
-	# Extract product table
-	product_flag = len([x for x in output_structure_df['sub_section'].unique() if 'product_content_id' in x]) > 0
+	# Split product rows by sector
+	product_flag = any(x['sub_section'] == 'product_content_id' for x in output_structure_plan)
 	if product_flag:
-		product_desc = sector_overview_layout.children[2].children[0]
-		product_datatable = sector_overview_layout.children[2].children[1].children.children[0]
-		product_datatable_columns = [col['name'] for col in product_datatable.columns]
-		product_selection_df = pd.DataFrame(product_datatable.data, columns=product_datatable_columns)
+		product_selection_table = get_product_table(
+			report_plan.filter_plan_by_section(selection_plan, 'Sector Overview', 'product_content_id')
+		)
+		product_selection_tables = dict(tuple(product_selection_table.groupby('Sector', sort=False)))
 	else:
-		product_desc = html.Div(className='d-none')
-		product_selection_df = pd.DataFrame(columns=['Sector', 'Product', 'Type', 'Scenario', 'Description'])
+		product_selection_table = None
+		product_selection_tables = {}
 
-	# Clean up sector layout
 	sector_desc = []
-	for sector_section in sector_overview_layout.children[1].children:
-		if hasattr(sector_section, 'children'):
-			sector_description_layout = sector_section.children
-			sector_name = sector_description_layout[0].children
-
-			# Filter product selection for this sector
-			if product_flag:
-				filtered_product_selection_df = product_selection_df[product_selection_df['Sector'] == sector_name]
-				filtered_product_selection_table = data_loader.create_data_table(
-					filtered_product_selection_df, ['Type'], ['Description']
+	for sector_name, description in sector_descriptions:
+		if description == "":
+			continue
+		if product_flag:
+			product_layout = [
+				html.P('The following rows contribute:'),
+				data_loader.create_data_table(
+					product_selection_tables.get(sector_name, product_selection_table.iloc[0:0]), ['Type'], ['Description']
 				)
-				product_layout = [product_desc] + [filtered_product_selection_table]
-			else:
-				product_layout = []
-
-			# Get sector-scenario for this sector
-			sector_scenario_layout = [
-				x for x in sector_detail_layout.children[1].children if x.children[0].children == sector_name
-			][0].children[1:]
-			sector_scenario_layout = [
-				y for x in sector_scenario_layout for y in [html.H3(x.children[0].children), *x.children[1:]]
 			]
-			updated_sector_scenario_layout = []
-			for c1 in sector_scenario_layout:
-				if hasattr(c1, 'children') and c1.__class__.__name__ != 'H3' and len(c1) > 1:
-					sub_layout = [
-						c2 for c2 in [html.H4(c1.children[0].children.replace('**', '')), *c1.children[1:]]
-					]
-					if sector_name == 'Sovereigns':
-						updated_sub_layout = []
-						for c2 in sub_layout:
-							if hasattr(c2, 'children') and c2.__class__.__name__ != 'H4' and len(c2) > 1:
-								sub_sub_layout = [
-									c3 for c3 in [html.H5(c2.children[0].children.replace('**', '')), *c2.children[1:]]
-								]
-								updated_sub_layout += sub_sub_layout
-							else:
-								updated_sub_layout.append(c2)
-						sub_layout = updated_sub_layout
-				else:
-					sub_layout = [c1]
-				updated_sector_scenario_layout += sub_layout
-			sector_scenario_layout = updated_sector_scenario_layout
-
-			# Define sector layout
-			sector_layout = html.Div([
-				html.H2(sector_name),
-				*sector_description_layout[1:],
-				*product_layout,
-				*sector_scenario_layout,
-			])
-			sector_desc.append(sector_layout)
-
-	all_sectors_layout = html.Div([
+		else:
+			product_layout = []
+		sector_desc.append(html.Div([
+			html.H2(sector_name),
+			dcc.Markdown(description, link_target="_blank", dangerously_allow_html=True, className='display-12', style={'textTransform': 'none'}),
+			*product_layout,
+			*sector_scenario_layouts.get(sector_name, []),
+		]))
+
+	return html.Div([
 		html.H1('Sector Detail'),
 		*sector_desc,
 	])
-	report_content[sector_overview_index] = all_sectors_layout
-	report_content.pop(sector_detail_index)
-	return report_content
 
-def create_sidebar_layout(report_content):
-	report_content, nav_groups = _extract_navigation_groups(report_content)
+def transform_report_content(report_content):
+	"""
+	Walk the report tree once, updating components in place:
+	drop parents left without children (and containers holding only a heading), give H1/H2 headings anchor ids,
+	and collect the table of contents groups of the headings that remain.
+	"""
+	toc_events = []
+	report_content = _transform_children(report_content, None, toc_events, True, True)
+	return report_content, _build_navigation_groups(toc_events)
+
+def _transform_children(children, current_h1, toc_events, prune_empty, add_anchors):
+	# A single child is not pruned, but headings within it still get anchors
+	if not isinstance(children, (list, tuple)):
+		if add_anchors and hasattr(children, 'children'):
+			_transform_children([children], current_h1, toc_events, False, True)
+		return children
+
+	updated_children = []
+	children_toc_events = []
+	for node in children:
+		if not hasattr(node, 'children'):
+			updated_children.append(node)
+			continue
+
+		anchor_flag = add_anchors and node.__class__.__name__ in {'H1', 'H2'}
+		node_toc_events = []
+		if prune_empty:
+			node_children = _transform_children(node.children, current_h1, node_toc_events, True, add_anchors and not anchor_flag)
+			if not node_children:
+				continue
+			node.children = node_children
+		elif add_anchors and not anchor_flag:
+			_transform_children(node.children, current_h1, node_toc_events, False, True)
+
+		if anchor_flag:
+			title = str(node.children)
+			base_id = title.replace(' ', '')
+			if node.__class__.__name__ == 'H1':
+				full_id = current_h1 = base_id
+				node_toc_events.append(('H1', title, full_id, None))
+			elif current_h1:
+				full_id = f"{current_h1}-{base_id}"
+				node_toc_events.append(('H2', title, full_id, current_h1))
+			else:
+				full_id = current_h1 = base_id
+				node_toc_events.append(('H2 without H1', title, full_id, current_h1))
+			node.id = full_id
+			node.style = (getattr(node, 'style', None) or {}) | {'scrollMarginTop': '120px'}
+
+		updated_children.append(node)
+		children_toc_events += node_toc_events
+
+	if prune_empty:
+		updated_children = [c for c in updated_children if c is not None and c != [] and c != '']
+		if (len(updated_children) == 1 and hasattr(updated_children[0], 'children')
+				and updated_children[0].__class__.__name__ in {'H1', 'H2', 'H3', 'H4', 'H5', 'H6'}):
+			return []
+	toc_events += children_toc_events
+	return updated_children if prune_empty else children
+
+def _build_navigation_groups(toc_events):
+	groups = []
+	for level, title, full_id, current_h1 in toc_events:
+		if level == 'H1':
+			groups.append({'id': full_id, 'title': title, 'links': [
+				dbc.NavLink(title, href=f"#{full_id}", external_link=True, className="level-1 fw-bold")
+			]})
+			continue
+		if level == 'H2 without H1':
+			groups.append({'id': full_id, 'title': title, 'links': [
+				dbc.NavLink(title, href=f"#{full_id}", external_link=True, className="level-1")
+			]})
+		for g in groups:
+			if g['id'] == current_h1:
+				g['links'].append(dbc.NavLink(title, href=f"#{full_id}", external_link=True, className="level-2"))
+				break
+	return groups
+
+def create_sidebar_layout(nav_groups):
 	accordion_items = [
 		dbc.AccordionItem(
 			dbc.Nav(group['links'], vertical=True, pills=True, className="ms-2"),
@@ -728,59 +627,4 @@ def create_sidebar_layout(report_content):
 		html.H4("Table of Contents", className='text-center p-0 mt-3'),
 		dbc.Accordion(accordion_items, start_collapsed=True, always_open=True, flush=True, id="toc-accordion")
 	]
-	return report_content, sidebar_layout
-
-def _extract_navigation_groups(report_content, current_h1=None, groups=None):
-	if groups is None:
-		groups = []
-	if not isinstance(report_content, (list, tuple)):
-		return report_content, groups
-
-	updated_children = []
-	for node in report_content:
-		if hasattr(node, 'children'):
-			child_content = node.children
-
-			if node.__class__.__name__ in {'H1', 'H2'}:
-				base_id = str(node.children).replace(' ', '')
-				if node.__class__.__name__ == 'H1':
-					full_id = base_id
-					current_h1 = full_id
-					groups.append({'id': full_id, 'title': str(node.children), 'links': []})
-					groups[-1]['links'].append(
-						dbc.NavLink(str(node.children), href=f"#{full_id}", external_link=True, className="level-1 fw-bold")
-					)
-				else:
-					if current_h1:
-						full_id = f"{current_h1}-{base_id}"
-					else:
-						full_id = base_id
-						current_h1 = full_id
-						groups.append({'id': full_id, 'title': str(node.children), 'links': []})
-						groups[-1]['links'].append(
-							dbc.NavLink(str(node.children), href=f"#{full_id}", external_link=True, className="level-1")
-						)
-					for g in groups:
-						if g['id'] == current_h1:
-							g['links'].append(
-								dbc.NavLink(str(node.children), href=f"#{full_id}", external_link=True, className="level-2")
-							)
-							break
-				params = {k: v for k, v in node.__dict__.items() if k in ['className', 'style']}
-				style = (params.get('style') or {}) | {'scrollMarginTop': '120px'}
-				params['style'] = style
-				updated_node = node.__class__(child_content, id=full_id, **params)
-				updated_children.append(updated_node)
-			else:
-				new_children, groups = _extract_navigation_groups(
-					child_content if isinstance(child_content, (list, tuple)) else [child_content],
-					current_h1, groups
-				)
-				if not isinstance(new_children, (list, tuple)):
-					new_children = [new_children]
-				params = {k: v for k, v in node.__dict__.items() if k in ['className', 'style', 'id']}
-				updated_children.append(node.__class__(new_children, **params))
-		else:
-			updated_children.append(node)
-
-	return updated_children, groups
+	return sidebar_layout
@@ -2,7 +2,7 @@ import dash
 from dash import html, dcc, callback, Output, Input
 import dash_bootstrap_components as dbc
 from utils import data_loader
-import pandas as pd
+from utils import config_registry
 
 dash.register_page(__name__, path='/reports/select-report')
 
@@ -21,9 +21,9 @@ def layout():
     Output("report-type-buttons", "children"),
     Input("output-structure-mapping-store", "data"),
 )
-def report_type_buttons(output_structure_mapping_dict):
+def report_type_buttons(config_version):
     button_list = []
-    output_structure_mapping_df = pd.DataFrame(output_structure_mapping_dict)
+    output_structure_mapping_df = config_registry.get_config_df('output_structure_mapping')
     yml = data_loader.load_yml_file('section/reports', 'button_description.yml')
     for i, report_type in enumerate(output_structure_mapping_df['report_type'].unique()):
         # get markdown from yml
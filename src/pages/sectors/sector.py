@@ -1,25 +1,22 @@
 import dash
 from dash import html, dcc, callback, Output, Input, State, ALL
 import dash_bootstrap_components as dbc
-import yaml
 import json
-from pathlib import Path
 import re
+from utils import data_loader
 
 dash.register_page(__name__, path='/sectors/sector')
 
 def layout():
     # define paths
-    YML_FOLDER = "../../assets/page_contents/exposure_class/sector"
-    FILE_PATH = Path(__file__).parent
-    YML_DIR = FILE_PATH.joinpath(YML_FOLDER).resolve()
+    YML_FOLDER = "exposure_class/sector"
+    YML_DIR = data_loader.PAGE_CONTENTS_PATH.joinpath(YML_FOLDER)
 
     # Load all YML files in the folder
     yml = {}
     for yml_file in YML_DIR.glob("*.yml"):
-        with open(yml_file, encoding="utf-8") as f:
-            data = yaml.safe_load(f)
-            yml.update(data)
+        data = data_loader.load_yml_file(YML_FOLDER, yml_file.name)
+        yml.update(data)
 
     # --- SORT KEYS BY SECTOR NAME ---
     # Create a list of (key, value) tuples sorted by the 'name' field (case-insensitive)
@@ -1,27 +1,24 @@
 import dash
 from dash import html, dcc, callback, Output, Input, State, ALL
 import dash_bootstrap_components as dbc
-import yaml
 import json
-from pathlib import Path
 import re
+from utils import data_loader
 
 dash.register_page(__name__, path='/sectors/sovereigns')
 
 def layout():
     # define paths
-    YML_FOLDER = "../../assets/page_contents/exposure_class/sovereigns"
-    FILE_PATH = Path(__file__).parent
-    YML_DIR = FILE_PATH.joinpath(YML_FOLDER).resolve()
+    YML_FOLDER = "exposure_class/sovereigns"
+    YML_DIR = data_loader.PAGE_CONTENTS_PATH.joinpath(YML_FOLDER)
     # define default index
     DEFAULT_INDEX = 1
     # Load all YML files in the folder
     yml = {}
     for yml_file in YML_DIR.glob("*.yml"):
-        with open(yml_file, encoding="utf-8") as f:
-            data = yaml.safe_load(f)
-            # Merge or append sectors; assumes each file is a dict of sectors
-            yml.update(data)
+        data = data_loader.load_yml_file(YML_FOLDER, yml_file.name)
+        # Merge or append sectors; assumes each file is a dict of sectors
+        yml.update(data)
     # create buttons
     button_list = []
     for k, v in yml.items():
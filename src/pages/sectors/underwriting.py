@@ -1,10 +1,9 @@
 import dash
 from dash import html, dcc, callback, Output, Input, State, ALL, no_update
 import dash_bootstrap_components as dbc
-import yaml
 import json
-from pathlib import Path
 import re
+from utils import data_loader
 
 dash.register_page(__name__, path='/sectors/underwriting')
 
@@ -17,16 +16,14 @@ def _clean(name: str) -> str:
 
 def layout():
     # define paths
-    YML_FOLDER = "../../assets/page_contents/exposure_class/underwriting"
-    FILE_PATH = Path(__file__).parent
-    YML_DIR = FILE_PATH.joinpath(YML_FOLDER).resolve()
+    YML_FOLDER = "exposure_class/underwriting"
+    YML_DIR = data_loader.PAGE_CONTENTS_PATH.joinpath(YML_FOLDER)
 
     # --- Load & merge all YML files deterministically
     merged = {}
     for yml_file in sorted(YML_DIR.glob("*.yml")):  # sorted -> deterministic merge order
-        with open(yml_file, encoding="utf-8") as f:
-            data = yaml.safe_load(f) or {}
-            merged.update(data)
+        data = data_loader.load_yml_file(YML_FOLDER, yml_file.name) or {}
+        merged.update(data)
 
     # Normalize keys to strings (JSON object keys are strings)
     yml = {str(k): v for k, v in merged.items()}
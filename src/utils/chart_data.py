@@ -0,0 +1,304 @@
+import json
+import logging
+import pickle
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io as pio
+from plotly.utils import PlotlyJSONEncoder
+
+from utils import data_loader
+
+CHART_DATA_PATH = data_loader.FILE_PATH.joinpath("./assets/data").resolve()
+CHART_DATA_CACHE_PATH = data_loader.BUILD_PATH.joinpath("./chart_data").resolve()
+CHART_DATA_FORMAT_VERSION = 1
+CHART_DATASETS = {
+	'transition_risk': 'transition_risk_data.csv',
+	'physical_risk': 'physical_risk_data.csv',
+}
+# Low-cardinality label columns, kept as categoricals
+CHART_CATEGORY_COLUMNS = ['Region', 'Variable', 'Scenario', 'Model', 'Unit']
+CHART_INDEX_COLUMNS = ['Region', 'Variable', 'Scenario']
+CHART_FIGURE_CACHE_MAX_ENTRIES = 256
+
+# Layout shared by all chart figures; callers add titles, margins and annotations
+CHART_BACKGROUND = '#FFFFFF'
+CHART_LAYOUT = go.Layout(
+	plot_bgcolor=CHART_BACKGROUND,
+	paper_bgcolor=CHART_BACKGROUND,
+	font=dict(color="#222"),
+	xaxis=dict(anchor='y', domain=[0.0, 1.0], gridcolor="#EEE"),
+	yaxis=dict(anchor='x', domain=[0.0, 1.0], gridcolor="#EEE"),
+	legend=dict(tracegroupgap=0),
+)
+
+# Parsed chart datasets keyed by dataset name -> (mtime_ns, size, DataFrame)
+CHART_DATA_CACHE = {}
+# Region -> variable -> scenario indexes keyed by dataset name -> (DataFrame, index), rebuilt when the data reloads
+CHART_INDEX_CACHE = {}
+_CHART_DATA_LOCK = threading.Lock()
+
+# Serialized chart figures keyed by figure key -> JSON string, in least recently used order
+CHART_FIGURE_CACHE = OrderedDict()
+CHART_FIGURE_CACHE_STATS = {'hits': 0, 'misses': 0}
+_CHART_FIGURE_CACHE_LOCK = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def get_chart_data_file_path(dataset_name):
+	return CHART_DATA_PATH.joinpath(CHART_DATASETS[dataset_name])
+
+def get_chart_data_cache_file_path(dataset_name):
+	return CHART_DATA_CACHE_PATH.joinpath(f'{dataset_name}.pickle')
+
+def get_year_columns(df):
+	"""
+	Return the year columns of a chart dataset, in column order.
+	"""
+	return [x for x in df.columns if str(x).isdigit()]
+
+def get_chart_years(df):
+	"""
+	Return the years of a chart dataset as integers, in column order.
+	"""
+	return [int(x) for x in get_year_columns(df)]
+
+def read_chart_csv(csv_file_path):
+	"""
+	Parse a chart CSV: year columns as floats (values such as "1,302.74" included), label columns as categoricals.
+	"""
+	header = pd.read_csv(csv_file_path, encoding='utf-8-sig', nrows=0).columns
+	df = pd.read_csv(
+		csv_file_path,
+		encoding='utf-8-sig',
+		thousands=',',
+		dtype={
+			**{x: 'category' for x in CHART_CATEGORY_COLUMNS if x in header},
+			**{x: 'float64' for x in header if str(x).isdigit()},
+		},
+	)
+	return df
+
+def compile_chart_data(dataset_name):
+	"""
+	Parse a chart CSV and write it to the binary cache under the build folder, with the CSV's mtime and size so
+	that load_chart_data can tell whether it is still current.
+	"""
+	csv_file_path = get_chart_data_file_path(dataset_name)
+	stat = csv_file_path.stat()
+	df = read_chart_csv(csv_file_path)
+	compiled = {
+		'format_version': CHART_DATA_FORMAT_VERSION,
+		'mtime_ns': stat.st_mtime_ns,
+		'size': stat.st_size,
+		'df': df,
+	}
+	data_loader.write_bytes_atomically(
+		get_chart_data_cache_file_path(dataset_name), pickle.dumps(compiled, protocol=pickle.HIGHEST_PROTOCOL)
+	)
+	return compiled
+
+def _load_compiled_chart_data(dataset_name, signature):
+	"""
+	Return the compiled DataFrame of a chart dataset, or None if it is not compiled or the CSV has changed.
+	"""
+	try:
+		with open(get_chart_data_cache_file_path(dataset_name), 'rb') as f:
+			compiled = pickle.load(f)
+	except Exception:
+		return None
+	if not isinstance(compiled, dict) or compiled.get('format_version') != CHART_DATA_FORMAT_VERSION:
+		return None
+	if (compiled['mtime_ns'], compiled['size']) != signature:
+		return None
+	return compiled['df']
+
+def load_chart_data(dataset_name):
+	"""
+	Return a chart dataset as a DataFrame.
+
+	The dataset is loaded once per process from its compiled binary copy, and re-read only when the CSV's mtime or
+	size changes. If the compiled copy is missing or out of date, the CSV is parsed and the copy is rewritten.
+	The returned DataFrame is shared between callbacks and must not be modified.
+	"""
+	csv_file_path = get_chart_data_file_path(dataset_name)
+	stat = csv_file_path.stat()
+	signature = (stat.st_mtime_ns, stat.st_size)
+
+	cached = CHART_DATA_CACHE.get(dataset_name)
+	if cached is not None and cached[:2] == signature:
+		return cached[2]
+
+	df = _load_compiled_chart_data(dataset_name, signature)
+	if df is None:
+		try:
+			df = compile_chart_data(dataset_name)['df']
+		except OSError as e:
+			logger.warning("Could not compile chart data %s to %s: %s", dataset_name, CHART_DATA_CACHE_PATH, e)
+			df = read_chart_csv(csv_file_path)
+	with _CHART_DATA_LOCK:
+		CHART_DATA_CACHE[dataset_name] = (*signature, df)
+	return df
+
+def get_chart_data_version(dataset_name):
+	"""
+	Return the (mtime_ns, size) of the loaded chart dataset, which identifies the version of the data.
+	"""
+	load_chart_data(dataset_name)
+	return CHART_DATA_CACHE[dataset_name][:2]
+
+def build_chart_index(df):
+	"""
+	Build the index of a chart dataset:
+	- years: the year columns as an integer array
+	- coverage: a rows x years boolean matrix, True where a row has a value for a year
+	- by_region: a nested {region: {variable: {scenario: {'rows', 'coverage'}}}} index, where rows are the positions
+	of the matching rows and coverage the years with a value in any of them.
+	Each level of by_region is sorted, so that its keys can be used as dropdown options directly.
+	"""
+	coverage = df[get_year_columns(df)].notna().to_numpy()
+	groups = df.groupby(CHART_INDEX_COLUMNS, observed=True, sort=False).indices
+	by_region = {}
+	for (region, variable, scenario), positions in sorted(groups.items()):
+		by_region.setdefault(region, {}).setdefault(variable, {})[scenario] = {
+			'rows': positions,
+			'coverage': coverage[positions].any(axis=0),
+		}
+	return {
+		'years': np.array(get_chart_years(df), dtype=int),
+		'coverage': coverage,
+		'by_region': by_region,
+	}
+
+def get_chart_index(dataset_name):
+	"""
+	Return the region -> variable -> scenario index of a chart dataset (see build_chart_index).
+	"""
+	df = load_chart_data(dataset_name)
+	cached = CHART_INDEX_CACHE.get(dataset_name)
+	if cached is not None and cached[0] is df:
+		return cached[1]
+	index = build_chart_index(df)
+	with _CHART_DATA_LOCK:
+		CHART_INDEX_CACHE[dataset_name] = (df, index)
+	return index
+
+def get_chart_regions(dataset_name):
+	return list(get_chart_index(dataset_name)['by_region'])
+
+def get_chart_variables(dataset_name, region):
+	return list(get_chart_index(dataset_name)['by_region'].get(region, {}))
+
+def get_chart_scenarios(dataset_name, region, variable):
+	return list(get_chart_index(dataset_name)['by_region'].get(region, {}).get(variable, {}))
+
+def _get_scenario_entries(dataset_name, region, variable, scenarios):
+	by_scenario = get_chart_index(dataset_name)['by_region'].get(region, {}).get(variable, {})
+	return [by_scenario[x] for x in dict.fromkeys(scenarios) if x in by_scenario]
+
+def get_chart_data_years(dataset_name, region, variable, scenarios):
+	"""
+	Return the sorted years with at least one value for a region, variable and any of the scenarios,
+	from the precomputed year coverage of each scenario.
+	"""
+	entries = _get_scenario_entries(dataset_name, region, variable, scenarios)
+	if not entries:
+		return []
+	years = get_chart_index(dataset_name)['years']
+	return years[np.logical_or.reduce([x['coverage'] for x in entries])].tolist()
+
+def select_chart_rows(dataset_name, region, variable, scenarios):
+	"""
+	Return the rows of a chart dataset for a region, variable and scenarios, in dataset order.
+	"""
+	entries = _get_scenario_entries(dataset_name, region, variable, scenarios)
+	positions = np.sort(np.concatenate([x['rows'] for x in entries])) if entries else np.array([], dtype=np.intp)
+	return load_chart_data(dataset_name).iloc[positions]
+
+def build_empty_figure():
+	"""
+	Return a figure with the shared chart layout and no traces, for placeholders.
+	"""
+	return go.Figure(layout=CHART_LAYOUT)
+
+def build_scenario_line_figure(rows_df, years, colors=None, scenario_order=None, year_labels=None):
+	"""
+	Return a line figure with one trace per scenario, built directly from the wide year columns of chart rows.
+
+	Scenarios are ordered as in scenario_order, followed by any other scenario in order of appearance, and take
+	their colors in that order (the template's colorway by default). Scenarios with several rows (e.g. several
+	models) get one trace through all their values, year by year. year_labels replaces the years on the x axis.
+	"""
+	colors = colors or pio.templates[pio.templates.default].layout.colorway
+	values = rows_df[[str(x) for x in years]].to_numpy()
+	row_scenarios = rows_df['Scenario'].to_numpy()
+	scenarios = list(dict.fromkeys(row_scenarios))
+	if scenario_order is not None:
+		scenarios = [x for x in scenario_order if x in scenarios] + [x for x in scenarios if x not in scenario_order]
+	x_values = np.array(year_labels if year_labels is not None else years)
+
+	traces = []
+	for i, scenario in enumerate(scenarios):
+		mask = row_scenarios == scenario
+		traces.append(go.Scatter(
+			x=np.repeat(x_values, mask.sum()),
+			y=values[mask].T.ravel(),
+			name=scenario,
+			legendgroup=scenario,
+			mode='lines',
+			line=dict(color=colors[i % len(colors)], dash='solid'),
+			marker=dict(symbol='circle'),
+			orientation='v',
+			showlegend=True,
+			xaxis='x',
+			yaxis='y',
+			hovertemplate=f'Scenario={scenario}<br>Year=%{{x}}<br>Value=%{{y}}<extra></extra>',
+		))
+	fig = go.Figure(traces, layout=CHART_LAYOUT)
+	fig.update_layout(xaxis_title_text='Year', yaxis_title_text='Value', legend_title_text='Scenario')
+	return fig
+
+def get_chart_figure(figure_key, build_figure):
+	"""
+	Return a chart figure as a plain dictionary, calling build_figure only if the figure key is not cached.
+	Figure keys should include the dataset version (see get_chart_data_version) and every input of the figure.
+	Callers get a fresh copy on every call, so the cached figure cannot be modified.
+	"""
+	with _CHART_FIGURE_CACHE_LOCK:
+		figure_json = CHART_FIGURE_CACHE.get(figure_key)
+		if figure_json is not None:
+			CHART_FIGURE_CACHE.move_to_end(figure_key)
+			CHART_FIGURE_CACHE_STATS['hits'] += 1
+
+	if figure_json is None:
+		figure_json = json.dumps(build_figure(), cls=PlotlyJSONEncoder)
+		with _CHART_FIGURE_CACHE_LOCK:
+			CHART_FIGURE_CACHE_STATS['misses'] += 1
+			CHART_FIGURE_CACHE[figure_key] = figure_json
+			CHART_FIGURE_CACHE.move_to_end(figure_key)
+			while len(CHART_FIGURE_CACHE) > CHART_FIGURE_CACHE_MAX_ENTRIES:
+				CHART_FIGURE_CACHE.popitem(last=False)
+	return json.loads(figure_json)
+
+def get_chart_figure_cache_stats():
+	"""
+	Return the chart figure cache hit/miss counters, number of cached figures and their size.
+	"""
+	with _CHART_FIGURE_CACHE_LOCK:
+		return {
+			**CHART_FIGURE_CACHE_STATS,
+			'figures': len(CHART_FIGURE_CACHE),
+			'bytes': sum(len(x) for x in CHART_FIGURE_CACHE.values()),
+		}
+
+def clear_chart_figure_cache():
+	"""
+	Drop all cached chart figures and reset the hit/miss counters.
+	"""
+	with _CHART_FIGURE_CACHE_LOCK:
+		CHART_FIGURE_CACHE.clear()
+		CHART_FIGURE_CACHE_STATS.update(hits=0, misses=0)
@@ -0,0 +1,268 @@
+import threading
+from types import MappingProxyType
+
+import pandas as pd
+
+from utils import data_loader
+
+# Read-only configuration shared by all callbacks of this process, built by load_config()
+_CONFIG = None
+_CONFIG_LOCK = threading.Lock()
+
+# Sector metadata table, rebuilt when the config version or a sector YAML file changes
+_SECTOR_METADATA = {'key': None, 'df': None}
+
+MATERIALITY_LEVELS = ['High', 'Medium', 'Low']
+OUTPUT_STRUCTURE_ID_COLUMNS = ['report_type', 'output_structure', 'materiality']
+
+SECTOR_GROUP_LABELS = {
+	'sector': 'Sectors',
+	'underwriting': 'Underwriting Classes',
+	'sovereigns': 'Sovereigns',
+}
+SECTOR_METADATA_COLUMNS = [
+	'sector_yml_file', 'sector_key', 'name', 'sector', 'test_report_position', 'group', 'sector_group', 'is_sovereign'
+]
+
+
+def load_config(config_json):
+	"""
+	Build the in-process config registry from a loaded config JSON.
+	Each sheet is kept as records and as a pre-built DataFrame with the sheet's original column order.
+	"""
+	global _CONFIG
+	columns = config_json.get('columns', {})
+	sheets = config_json.get('sheets', {})
+	config = {
+		'version': data_loader.get_config_version(config_json),
+		'sheets': sheets,
+		'dfs': {
+			sheet_name: pd.DataFrame(records, columns=columns.get(sheet_name))
+			for sheet_name, records in sheets.items()
+		},
+	}
+	if 'exposure_sector_product_mapping' in config['dfs']:
+		config['exposure_index'] = build_exposure_index(config['dfs']['exposure_sector_product_mapping'])
+	if 'output_structure_mapping' in sheets:
+		config['output_structure_plans'] = {
+			report_type: tuple(
+				MappingProxyType(x) for x in compile_output_structure_plan(
+					sheets['output_structure_mapping'], columns.get('output_structure_mapping', []), report_type
+				)
+			)
+			for report_type in dict.fromkeys(r.get('report_type') for r in sheets['output_structure_mapping'])
+		}
+	with _CONFIG_LOCK:
+		_CONFIG = config
+	return config
+
+def build_exposure_index(exposure_sector_product_mapping_df):
+	"""
+	Precompute the lookups made on exposure_sector_product_mapping by the customise and generate report pages.
+
+	Keys are (institution, exposure, sector, type) tuples, (exposure, sector) tuples for mapping rows that apply to
+	all institutions, and sector_yml_file. Mapping rows are kept in sheet order, including duplicates.
+	"""
+	records = exposure_sector_product_mapping_df.to_dict(orient='records')
+	institutions = [x for x in dict.fromkeys(r['institution'] for r in records) if x.upper() != 'ALL']
+
+	institution_dfs = {}
+	exposures = {}
+	exposure_options = {}
+	for institution in institutions + ['All']:
+		institution_df = data_loader.get_selected_institution_type_mapping(exposure_sector_product_mapping_df, institution)
+		institution_dfs[institution] = institution_df
+		institution_records = institution_df.to_dict(orient='records')
+		exposures[institution] = tuple(dict.fromkeys(r['exposure'] for r in institution_records))
+		for exposure in exposures[institution]:
+			exposure_records = [r for r in institution_records if r['exposure'] == exposure]
+			exposure_options[(institution, exposure)] = {
+				'sectors': tuple(dict.fromkeys(r['sector'] for r in exposure_records)),
+				'types': tuple(dict.fromkeys(r['type'] for r in exposure_records)),
+				'combinations': frozenset((r['sector'], r['type']) for r in exposure_records),
+			}
+
+	by_selection = {}
+	by_exposure_sector = {}
+	by_sector_yml_file = {}
+	for r in records:
+		by_selection.setdefault((r['institution'], r['exposure'], r['sector'], r['type']), []).append(r)
+		by_exposure_sector.setdefault((r['exposure'], r['sector']), []).append(r)
+		by_sector_yml_file.setdefault(r['sector_yml_file'], []).append(r)
+
+	return {
+		'institutions': tuple(institutions),
+		'institution_dfs': institution_dfs,
+		'exposures': exposures,
+		'exposure_options': exposure_options,
+		'by_selection': {k: tuple(v) for k, v in by_selection.items()},
+		'by_exposure_sector': {k: tuple(v) for k, v in by_exposure_sector.items()},
+		'by_sector_yml_file': {k: tuple(v) for k, v in by_sector_yml_file.items()},
+	}
+
+def compile_output_structure_plan(output_structure_records, output_structure_columns, report_type):
+	"""
+	Compile the output_structure_mapping rows of a report type into an ordered list of
+	{sort_order, report_type, output_structure, materiality, sub_section, content_id} instructions.
+
+	Sections keep their sheet order and materiality 'All' expands to High, Medium and Low (except for Scenario reports).
+	Within a section and materiality, instructions follow the sheet's sub section column order.
+	"""
+	rows = [r for r in output_structure_records if r.get('report_type') == report_type]
+	if report_type != 'Scenario':
+		rows = [
+			{**r, 'materiality': materiality}
+			for r in rows
+			for materiality in (MATERIALITY_LEVELS if r.get('materiality') == 'All' else [r.get('materiality')])
+			if materiality in MATERIALITY_LEVELS
+		]
+
+	sections = list(dict.fromkeys(r['output_structure'] for r in rows))
+	if report_type != 'Scenario':
+		materiality_sort_key = MATERIALITY_LEVELS.index
+	else:
+		materiality_sort_key = str
+	id_keys = sorted(
+		dict.fromkeys(tuple(r.get(x) for x in OUTPUT_STRUCTURE_ID_COLUMNS) for r in rows),
+		key=lambda x: (sections.index(x[1]), materiality_sort_key(x[2]))
+	)
+
+	sub_sections = [x for x in output_structure_columns if x not in OUTPUT_STRUCTURE_ID_COLUMNS]
+	plan = []
+	for id_key in id_keys:
+		id_rows = [r for r in rows if tuple(r.get(x) for x in OUTPUT_STRUCTURE_ID_COLUMNS) == id_key]
+		for sub_section in sub_sections:
+			for r in id_rows:
+				if r.get(sub_section) is not None:
+					plan.append({
+						'sort_order': len(plan),
+						**dict(zip(OUTPUT_STRUCTURE_ID_COLUMNS, id_key)),
+						'sub_section': sub_section,
+						'content_id': r[sub_section],
+					})
+	return plan
+
+def get_config():
+	"""
+	Return the config registry, loading the compiled config JSON on first use.
+	"""
+	if _CONFIG is None:
+		load_config(data_loader.load_config_json())
+	return _CONFIG
+
+def get_config_version():
+	"""
+	Return the id of the loaded config version. This is what the config dcc.Stores carry.
+	"""
+	return get_config()['version']
+
+def get_config_df(sheet_name):
+	"""
+	Return the pre-built DataFrame of a config sheet.
+	The DataFrame is shared between callbacks and must be copied before being modified.
+	"""
+	return get_config()['dfs'][sheet_name]
+
+def get_output_structure_plan(report_type):
+	"""
+	Return the precompiled output structure instructions of a report type, as a tuple of read-only mappings.
+	"""
+	return get_config()['output_structure_plans'].get(report_type, ())
+
+def get_institutions():
+	"""
+	Return the institution types of exposure_sector_product_mapping, excluding 'All'.
+	"""
+	return get_config()['exposure_index']['institutions']
+
+def get_institution_mapping_df(institution_type):
+	"""
+	Return the exposure_sector_product_mapping rows that apply to an institution type (its own and 'All' rows).
+	"""
+	institution_dfs = get_config()['exposure_index']['institution_dfs']
+	if institution_type in institution_dfs:
+		return institution_dfs[institution_type]
+	return data_loader.get_selected_institution_type_mapping(
+		get_config_df('exposure_sector_product_mapping'), institution_type
+	)
+
+def get_institution_exposures(institution_type):
+	"""
+	Return the exposures available to an institution type, in sheet order.
+	Institution types that are not in the sheet only get the exposures that apply to all institutions.
+	"""
+	exposures = get_config()['exposure_index']['exposures']
+	return exposures.get(institution_type, exposures['All'])
+
+def get_exposure_selection_options(institution_type, exposure_type):
+	"""
+	Return the sectors, types and valid (sector, type) combinations of an institution's exposure.
+	"""
+	exposure_index = get_config()['exposure_index']
+	if institution_type not in exposure_index['institutions']:
+		institution_type = 'All'
+	return exposure_index['exposure_options'].get(
+		(institution_type, exposure_type), {'sectors': (), 'types': (), 'combinations': frozenset()}
+	)
+
+def get_mapping_rows(institution_type, exposure_type, sector, ptype):
+	"""
+	Return the exposure_sector_product_mapping rows (with yml file paths) matching a user selection.
+	"""
+	return get_config()['exposure_index']['by_selection'].get((institution_type, exposure_type, sector, ptype), ())
+
+def get_exposure_sector_mapping_rows(exposure_type, sector):
+	"""
+	Return the exposure_sector_product_mapping rows matching an exposure and sector, regardless of institution and type.
+	"""
+	return get_config()['exposure_index']['by_exposure_sector'].get((exposure_type, sector), ())
+
+def get_sector_yml_files():
+	"""
+	Return the unique sector yml files of exposure_sector_product_mapping, in sheet order.
+	"""
+	return tuple(get_config()['exposure_index']['by_sector_yml_file'])
+
+def get_sector_yml_file_mapping_rows(sector_yml_file):
+	"""
+	Return the exposure_sector_product_mapping rows that use a sector yml file.
+	"""
+	return get_config()['exposure_index']['by_sector_yml_file'].get(sector_yml_file, ())
+
+def build_sector_metadata_df(sector_yml_files):
+	"""
+	Build a table of sector yml file headers indexed by sector_yml_file:
+	the first key (sort order), name, display sector ('Sovereigns' for all sovereigns), test_report_position,
+	group (folder under exposure_class), sector group label and sovereign flag.
+	"""
+	rows = []
+	for sector_yml_file in sector_yml_files:
+		sector_key, sector_yml = next(iter(data_loader.load_yml_file('exposure_class', f'{sector_yml_file}.yml').items()))
+		group = sector_yml_file.split('/')[0]
+		is_sovereign = 'sovereign' in sector_yml['name'].lower()
+		rows.append({
+			'sector_yml_file': sector_yml_file,
+			'sector_key': sector_key,
+			'name': sector_yml['name'],
+			'sector': 'Sovereigns' if is_sovereign else sector_yml['name'],
+			'test_report_position': sector_yml.get('test_report_position'),
+			'group': group,
+			'sector_group': SECTOR_GROUP_LABELS.get(group, 'Other'),
+			'is_sovereign': is_sovereign,
+		})
+	return pd.DataFrame(rows, columns=SECTOR_METADATA_COLUMNS).set_index('sector_yml_file', drop=False)
+
+def get_sector_metadata_df():
+	"""
+	Return the sector metadata table of all sector yml files in exposure_sector_product_mapping.
+	The table is built once and only rebuilt if the config or one of the sector YAML files changes.
+	"""
+	sector_yml_files = get_sector_yml_files()
+	key = (get_config_version(), tuple(
+		data_loader.get_yml_file_signature('exposure_class', f'{sector_yml_file}.yml') for sector_yml_file in sector_yml_files
+	))
+	if _SECTOR_METADATA['key'] != key:
+		sector_metadata_df = build_sector_metadata_df(sector_yml_files)
+		with _CONFIG_LOCK:
+			_SECTOR_METADATA.update(key=key, df=sector_metadata_df)
+	return _SECTOR_METADATA['df']
@@ -0,0 +1,56 @@
+import pickle
+from datetime import datetime
+
+import yaml
+
+from utils import data_loader
+from utils import reports
+
+
+def _iter_strings(yml):
+	if isinstance(yml, str):
+		yield yml
+	elif isinstance(yml, dict):
+		for value in yml.values():
+			yield from _iter_strings(value)
+	elif isinstance(yml, list):
+		for value in yml:
+			yield from _iter_strings(value)
+
+
+def compile_content_bundle(output_file_path=None):
+	"""
+	Parse every YAML file under page_contents and write them into one versioned pickle snapshot.
+
+	Each entry records the source file's size, mtime and SHA-256 so that data_loader.load_yml_file
+	can tell whether the bundled copy is still current. The content hash identifies the whole tree.
+	Every text in the YAML files is also pre-rendered from Markdown to HTML for exported reports.
+	"""
+	output_file_path = output_file_path or data_loader.CONTENT_BUNDLE_PATH
+	files = {}
+	for yml_file_path in sorted(data_loader.PAGE_CONTENTS_PATH.rglob('*.yml')):
+		raw_bytes = yml_file_path.read_bytes()
+		stat = yml_file_path.stat()
+		files[yml_file_path.relative_to(data_loader.PAGE_CONTENTS_PATH).as_posix()] = {
+			'sha256': data_loader.hash_bytes(raw_bytes),
+			'mtime_ns': stat.st_mtime_ns,
+			'size': stat.st_size,
+			'data': yaml.load(raw_bytes.decode('utf-8'), Loader=data_loader.YML_LOADER),
+		}
+
+	markdown_html = {
+		reports.get_markdown_digest(text): reports.render_markdown(text)
+		for text in dict.fromkeys(x for entry in files.values() for x in _iter_strings(entry['data']))
+	}
+
+	content_hash = data_loader.hash_bytes('\n'.join(f'{k}:{v["sha256"]}' for k, v in files.items()).encode('utf-8'))
+	bundle = {
+		'format_version': data_loader.CONTENT_BUNDLE_FORMAT_VERSION,
+		'content_hash': content_hash,
+		'built_at': datetime.now().isoformat(timespec='seconds'),
+		'files': files,
+		'markdown_html': markdown_html,
+	}
+	data_loader.write_bytes_atomically(output_file_path, pickle.dumps(bundle, protocol=pickle.HIGHEST_PROTOCOL))
+	data_loader.reset_content_bundle()
+	return bundle
@@ -1,6 +1,12 @@
 import pandas as pd
-from datetime import datetime
 import json
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
 from pathlib import Path
 import yaml
 from dash import dcc, dash_table, html
@@ -8,7 +14,29 @@ import dash_bootstrap_components as dbc
 
 FILE_PATH = Path(__file__).parent.parent
 CONFIG_PATH = FILE_PATH.joinpath("./assets/config").resolve()
+CONFIG_EXCEL_PATH = CONFIG_PATH.joinpath("./config.xlsx").resolve()
+CONFIG_JSON_PATH = CONFIG_PATH.joinpath("./config.json").resolve()
 PAGE_CONTENTS_PATH = FILE_PATH.joinpath("./assets/page_contents").resolve()
+BUILD_PATH = FILE_PATH.joinpath("./build").resolve()
+CONTENT_BUNDLE_PATH = BUILD_PATH.joinpath("./content_bundle.pickle").resolve()
+CONTENT_BUNDLE_FORMAT_VERSION = 2
+YML_LOADER = getattr(yaml, 'CLoader', yaml.SafeLoader)
+
+# Parsed YAML contents keyed by resolved file path -> (mtime_ns, size, parsed yml)
+YML_CACHE = {}
+YML_CACHE_STATS = {'hits': 0, 'misses': 0}
+_YML_CACHE_LOCK = threading.Lock()
+
+# Precompiled page contents snapshot, loaded lazily by load_content_bundle()
+_CONTENT_BUNDLE = None
+
+# User selection frames keyed by a hash of the stored selections, in least recently used order
+USER_SELECTION_COLUMNS = ['report', 'id', 'institution', 'exposure', 'sector', 'ptype', 'label', 'value']
+USER_SELECTION_CACHE = OrderedDict()
+USER_SELECTION_CACHE_MAX_ENTRIES = 32
+_USER_SELECTION_CACHE_LOCK = threading.Lock()
+
+logger = logging.getLogger(__name__)
 
 
 def clean_string(s):
@@ -22,42 +50,220 @@ def clean_df_columns(input_df):
 	Clean DataFrame column names.
 	"""
 	output_df = input_df.copy()
-	output_df.columns = [clean_string(col) for col in output_df.columns]
+	output_df.columns = (
+		output_df.columns.astype(str).str.strip().str.lower().str.replace('-', '_').str.replace(' ', '_')
+	)
 	return output_df
 
-def convert_config_excel_to_json():
+def df_to_records(input_df):
+	"""
+	Convert a DataFrame to a list of typed records, leaving out missing values instead of emitting NaN.
+	"""
+	typed_df = input_df.convert_dtypes()
+	present = typed_df.notna().to_numpy()
+	return [
+		{k: v for (k, v), is_present in zip(record.items(), record_present) if is_present}
+		for record, record_present in zip(typed_df.to_dict(orient='records'), present)
+	]
+
+def hash_bytes(raw_bytes):
+	"""
+	Return the SHA-256 hex digest of raw file contents.
+	"""
+	return hashlib.sha256(raw_bytes).hexdigest()
+
+def write_bytes_atomically(output_file_path, raw_bytes):
 	"""
-	Convert an Excel file with multiple sheets to a versioned JSON file.
+	Write a file via a temporary file in the same folder so that readers never see a partial write.
 	"""
-	timestamp = datetime.now().strftime('%Y%m%d_%H%M')
-	input_file_path = CONFIG_PATH.joinpath('./config.xlsx').resolve()
-	output_file_path = CONFIG_PATH.joinpath('./config.json').resolve()
+	output_file_path.parent.mkdir(parents=True, exist_ok=True)
+	fd, tmp_file_path = tempfile.mkstemp(dir=output_file_path.parent, prefix=f'.{output_file_path.name}.')
+	try:
+		with os.fdopen(fd, 'wb') as f:
+			f.write(raw_bytes)
+		os.chmod(tmp_file_path, 0o644)
+		os.replace(tmp_file_path, output_file_path)
+	except BaseException:
+		if os.path.exists(tmp_file_path):
+			os.remove(tmp_file_path)
+		raise
 
-	xls = pd.ExcelFile(input_file_path)
-	converted_json = {'sheets': {}}
-	for sheet_name in xls.sheet_names:
-		df = pd.read_excel(input_file_path, sheet_name=sheet_name)
+def read_config_excel(input_file_path=CONFIG_EXCEL_PATH):
+	"""
+	Read all sheets of the Excel config file in a single pass over the workbook.
+	Returns the records and column order per cleaned sheet name.
+	"""
+	all_sheets = pd.read_excel(input_file_path, sheet_name=None)
+	converted_json = {'columns': {}, 'sheets': {}}
+	for sheet_name, df in all_sheets.items():
 		cleaned_df = clean_df_columns(df)
-		converted_json['sheets'][clean_string(sheet_name)] = cleaned_df.to_dict(orient='records')
+		converted_json['columns'][clean_string(sheet_name)] = list(cleaned_df.columns)
+		converted_json['sheets'][clean_string(sheet_name)] = df_to_records(cleaned_df)
+	return converted_json
 
-	with open(output_file_path, 'w', encoding='utf-8') as f:
-		json.dump(converted_json, f, indent=2)
+def convert_config_excel_to_json():
+	"""
+	Convert an Excel file with multiple sheets to a JSON file recording the hash of its source.
+	This is a build step (python src/manage.py compile-config) and is not run when the app starts.
+	"""
+	converted_json = {
+		'source_sha256': hash_bytes(CONFIG_EXCEL_PATH.read_bytes()),
+		**read_config_excel(CONFIG_EXCEL_PATH),
+	}
+	write_bytes_atomically(CONFIG_JSON_PATH, json.dumps(converted_json, indent=2).encode('utf-8'))
 	return converted_json
 
+def load_config_json():
+	"""
+	Load the compiled configuration JSON file.
+
+	The JSON file is only trusted if its recorded source hash matches config.xlsx (or if the Excel file is not
+	deployed). Otherwise the Excel file is read in memory, without rewriting the JSON, and a warning is logged.
+	"""
+	config_json = {}
+	if CONFIG_JSON_PATH.exists():
+		with open(CONFIG_JSON_PATH, encoding='utf-8') as f:
+			config_json = json.load(f)
+	if not CONFIG_EXCEL_PATH.exists():
+		return config_json
+
+	source_sha256 = hash_bytes(CONFIG_EXCEL_PATH.read_bytes())
+	if config_json.get('source_sha256') == source_sha256:
+		return config_json
+
+	logger.warning(
+		"%s is out of date with %s; run 'python src/manage.py compile-config'",
+		CONFIG_JSON_PATH.name, CONFIG_EXCEL_PATH.name
+	)
+	return {'source_sha256': source_sha256, **read_config_excel(CONFIG_EXCEL_PATH)}
+
+def get_config_version(config_json):
+	"""
+	Return an id for a loaded config: the hash of its Excel source, or of the JSON itself if not recorded.
+	"""
+	if config_json.get('source_sha256'):
+		return config_json['source_sha256']
+	return hash_bytes(json.dumps(config_json, sort_keys=True).encode('utf-8'))
+
+def load_content_bundle():
+	"""
+	Load the precompiled page contents bundle (see utils.content_bundle) once per process.
+	Returns an empty dictionary if the bundle has not been built or is from an incompatible format.
+	"""
+	global _CONTENT_BUNDLE
+	if _CONTENT_BUNDLE is None:
+		bundle = {}
+		if CONTENT_BUNDLE_PATH.exists():
+			try:
+				with open(CONTENT_BUNDLE_PATH, 'rb') as f:
+					bundle = pickle.load(f)
+			except Exception:
+				bundle = {}
+		if not isinstance(bundle, dict) or bundle.get('format_version') != CONTENT_BUNDLE_FORMAT_VERSION:
+			bundle = {}
+		_CONTENT_BUNDLE = bundle
+	return _CONTENT_BUNDLE
+
+def reset_content_bundle():
+	"""
+	Forget the loaded content bundle so that the next lookup reloads it from disk.
+	"""
+	global _CONTENT_BUNDLE
+	_CONTENT_BUNDLE = None
+	clear_yml_cache()
+
+def _get_bundled_yml(yml_file_path, signature):
+	"""
+	Return the precompiled contents of a YAML file, or None if it is not bundled or the source has changed.
+	"""
+	bundled_files = load_content_bundle().get('files', {})
+	try:
+		entry = bundled_files.get(yml_file_path.relative_to(PAGE_CONTENTS_PATH).as_posix())
+	except ValueError:
+		return None
+	if entry is None:
+		return None
+	if (entry['mtime_ns'], entry['size']) != signature:
+		# mtimes are not preserved by checkouts, so fall back to comparing the source hash
+		if hash_bytes(yml_file_path.read_bytes()) != entry['sha256']:
+			return None
+	return entry['data']
+
+def get_yml_file_signature(yml_folder_path, yml_file_name):
+	"""
+	Return the (mtime_ns, size) of a page contents YAML file, which is what its cached contents are keyed on.
+	"""
+	stat = PAGE_CONTENTS_PATH.joinpath(yml_folder_path).joinpath(yml_file_name).stat()
+	return stat.st_mtime_ns, stat.st_size
+
 def load_yml_file(yml_folder_path, yml_file_name):
 	"""
 	Load a YAML file and return its contents as a dictionary.
+
+	Parsed contents are cached per process and re-parsed only when the file's mtime or size changes.
+	Files included in an up-to-date content bundle are taken from the bundle instead of being parsed.
+	The returned dictionary is shared between callers and must not be mutated.
 	"""
 	yml_file_path = PAGE_CONTENTS_PATH.joinpath(yml_folder_path).joinpath(yml_file_name).resolve()
-	with open(yml_file_path, encoding="utf-8") as f:
-		yml = yaml.load(f, Loader=getattr(yaml, 'CLoader', yaml.SafeLoader))
+	stat = yml_file_path.stat()
+	signature = (stat.st_mtime_ns, stat.st_size)
+
+	cached = YML_CACHE.get(yml_file_path)
+	if cached is not None and cached[:2] == signature:
+		with _YML_CACHE_LOCK:
+			YML_CACHE_STATS['hits'] += 1
+		return cached[2]
+
+	yml = _get_bundled_yml(yml_file_path, signature)
+	if yml is None:
+		with open(yml_file_path, encoding="utf-8") as f:
+			yml = yaml.load(f, Loader=YML_LOADER)
+	with _YML_CACHE_LOCK:
+		YML_CACHE[yml_file_path] = (*signature, yml)
+		YML_CACHE_STATS['misses'] += 1
 	return yml
 
+def _iter_yml_file_signatures(folder_path, relative_path=''):
+	# One scandir pass per folder; DirEntry caches the file type, so only YAML files are stat'ed
+	with os.scandir(folder_path) as entries:
+		for entry in entries:
+			entry_path = f'{relative_path}{entry.name}'
+			if entry.is_dir():
+				yield from _iter_yml_file_signatures(entry.path, f'{entry_path}/')
+			elif entry.name.endswith('.yml'):
+				stat = entry.stat()
+				yield f'{entry_path}:{stat.st_mtime_ns}:{stat.st_size}'
+
+def get_content_version():
+	"""
+	Return an id of the current page contents, built from the path, mtime and size of every YAML file.
+	It is rebuilt on every call, so that edited, added and removed files are picked up without a restart.
+	"""
+	signature = '\n'.join(sorted(_iter_yml_file_signatures(PAGE_CONTENTS_PATH)))
+	return hash_bytes(signature.encode('utf-8'))
+
+def get_yml_cache_stats():
+	"""
+	Return the YAML content cache hit/miss counters and number of cached files.
+	"""
+	with _YML_CACHE_LOCK:
+		return {**YML_CACHE_STATS, 'files': len(YML_CACHE)}
+
+def clear_yml_cache():
+	"""
+	Drop all cached YAML contents and reset the hit/miss counters.
+	"""
+	with _YML_CACHE_LOCK:
+		YML_CACHE.clear()
+		YML_CACHE_STATS.update(hits=0, misses=0)
+
 def load_config_json_and_store():
 	"""
 	Load the configuration JSON file and return its contents as a dictionary and dcc.Store.
+	The config stores only carry the config version id; callbacks read the sheets from utils.config_registry.
 	"""
-	config_json = convert_config_excel_to_json()
+	config_json = load_config_json()
+	config_version = get_config_version(config_json)
 
 	# Create stores
 	stores = [
@@ -71,27 +277,45 @@ def load_config_json_and_store():
 	] + [
 		dcc.Store(
 			id=f'{sheet_name.replace("_", "-")}-store',
-			data=sheet_data,
+			data=config_version,
 			storage_type='session',
-		) for sheet_name, sheet_data in config_json['sheets'].items()
+		) for sheet_name in config_json['sheets']
 	]
 	return config_json, stores
 
-def get_selected_institution_type_mapping(exposure_product_mapping_dict, institution_type):
-	exposure_product_mapping_df = pd.DataFrame(exposure_product_mapping_dict)
+def get_selected_institution_type_mapping(exposure_product_mapping_df, institution_type):
 	exposure_product_mapping_df = exposure_product_mapping_df[exposure_product_mapping_df['institution'].isin([institution_type, 'All'])]
 	return exposure_product_mapping_df
 
+def get_user_selection_records(all_stored_data):
+	"""
+	Flatten the stored user selections into one list of records, in store order.
+	"""
+	return [r for records in (all_stored_data or {}).values() for r in records]
+
 def get_user_selection_from_store(all_stored_data, report_type):
-	all_user_selection_df = pd.DataFrame()
-	for k, v in all_stored_data.items():
-		user_selection_df = pd.DataFrame(all_stored_data[k])
-		all_user_selection_df = pd.concat([all_user_selection_df, user_selection_df])
-
-	if len(all_user_selection_df) == 0:
-		all_user_selection_df = pd.DataFrame([], columns=[
-			'report', 'id', 'institution', 'exposure', 'sector', 'ptype', 'label', 'value'
-		])
+	"""
+	Return all stored user selections as one DataFrame, built from the flattened records in a single pass.
+	Frames are cached by the store contents so that the callbacks of one selection share them,
+	and must be copied before being modified.
+	"""
+	cache_key = hash_bytes(json.dumps(all_stored_data, separators=(',', ':'), default=str).encode('utf-8'))
+	with _USER_SELECTION_CACHE_LOCK:
+		all_user_selection_df = USER_SELECTION_CACHE.get(cache_key)
+		if all_user_selection_df is not None:
+			USER_SELECTION_CACHE.move_to_end(cache_key)
+			return all_user_selection_df
+
+	user_selection_records = get_user_selection_records(all_stored_data)
+	if len(user_selection_records) == 0:
+		all_user_selection_df = pd.DataFrame([], columns=USER_SELECTION_COLUMNS)
+	else:
+		all_user_selection_df = pd.DataFrame(user_selection_records)
+
+	with _USER_SELECTION_CACHE_LOCK:
+		USER_SELECTION_CACHE[cache_key] = all_user_selection_df
+		while len(USER_SELECTION_CACHE) > USER_SELECTION_CACHE_MAX_ENTRIES:
+			USER_SELECTION_CACHE.popitem(last=False)
 	return all_user_selection_df
 
 def rename_user_selection_data_columns(all_user_selection_df):
@@ -0,0 +1,261 @@
+import base64
+import io
+import json
+import logging
+import mimetypes
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from PIL import Image
+
+from utils import data_loader
+
+IMAGES_PATH = data_loader.FILE_PATH.joinpath("./assets/images").resolve()
+IMAGE_SIDECAR_PATH = data_loader.BUILD_PATH.joinpath("./image_data_uris").resolve()
+IMAGE_SIDECAR_INDEX_PATH = IMAGE_SIDECAR_PATH.joinpath("./index.json").resolve()
+IMAGE_SIDECAR_FORMAT_VERSION = 1
+IMAGE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Size-optimized variants of the images for exported reports, by profile name.
+# max_width downscales wider images, format and quality set the encoding, and colors reduces PNGs to a palette.
+IMAGE_PROFILES = {
+	'web': {'max_width': 1200, 'format': 'WEBP', 'quality': 80},
+	'compact': {'max_width': 800, 'format': 'WEBP', 'quality': 60},
+	'print': {'max_width': 1600, 'format': 'PNG', 'colors': 256},
+	'jpeg': {'max_width': 1200, 'format': 'JPEG', 'quality': 80},
+}
+IMAGE_VARIANTS_PATH = data_loader.BUILD_PATH.joinpath("./image_variants").resolve()
+IMAGE_VARIANT_SUFFIXES = ('.png', '.jpg', '.jpeg')
+IMAGE_VARIANT_MIME_TYPES = {'WEBP': 'image/webp', 'PNG': 'image/png', 'JPEG': 'image/jpeg'}
+
+# Data URIs keyed by (image file path, profile) -> (mtime_ns, size, data URI), in least recently used order
+IMAGE_CACHE = OrderedDict()
+IMAGE_CACHE_STATS = {'hits': 0, 'sidecar_hits': 0, 'misses': 0, 'bytes': 0}
+_IMAGE_CACHE_LOCK = threading.Lock()
+
+# Index of the precomputed sidecar, loaded once per process
+_IMAGE_SIDECAR_INDEX = None
+
+logger = logging.getLogger(__name__)
+
+
+def resolve_image_path(src):
+	"""
+	Return the file path of an image referenced by the app, e.g. '/assets/images/x.png', relative to the src folder.
+	"""
+	return data_loader.FILE_PATH.joinpath(src.lstrip('/')).resolve()
+
+def encode_data_uri(raw_bytes, image_file_path, mime=None):
+	if mime is None:
+		mime, _ = mimetypes.guess_type(str(image_file_path))
+	return f'data:{mime or "application/octet-stream"};base64,{base64.b64encode(raw_bytes).decode("utf-8")}'
+
+def build_image_variant(raw_bytes, profile):
+	"""
+	Downscale and re-encode an image with Pillow according to an image profile and return the encoded bytes.
+	"""
+	with Image.open(io.BytesIO(raw_bytes)) as source_image:
+		image = source_image.copy()
+	max_width = profile.get('max_width')
+	if max_width and image.width > max_width:
+		image = image.resize((max_width, max(1, round(image.height * max_width / image.width))), Image.LANCZOS)
+
+	image_format = profile['format']
+	has_alpha = image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+	if image_format == 'JPEG':
+		# JPEG has no alpha channel, so flatten transparent images onto white
+		image = image.convert('RGBA')
+		background = Image.new('RGB', image.size, (255, 255, 255))
+		background.paste(image, mask=image.getchannel('A'))
+		image = background
+	elif image.mode not in ('RGB', 'RGBA'):
+		image = image.convert('RGBA' if has_alpha else 'RGB')
+	if profile.get('colors') and image_format == 'PNG':
+		image = image.quantize(colors=profile['colors'], method=Image.Quantize.FASTOCTREE)
+
+	save_kwargs = {'optimize': True}
+	if profile.get('quality') is not None:
+		save_kwargs['quality'] = profile['quality']
+	output = io.BytesIO()
+	image.save(output, format=image_format, **save_kwargs)
+	return output.getvalue()
+
+def _get_variant_data_uri(image_file_path, raw_bytes, profile_name):
+	"""
+	Return the data URI of an image variant, building it once per source hash and profile and keeping it on disk.
+	The original is used if the variant is not smaller, or the image cannot be converted.
+	"""
+	profile = IMAGE_PROFILES[profile_name]
+	if image_file_path.suffix.lower() not in IMAGE_VARIANT_SUFFIXES:
+		return encode_data_uri(raw_bytes, image_file_path)
+	variant_key = data_loader.hash_bytes(
+		json.dumps([data_loader.hash_bytes(raw_bytes), profile], sort_keys=True).encode('utf-8')
+	)
+	variant_file_path = IMAGE_VARIANTS_PATH.joinpath(f'{variant_key}.{profile["format"].lower()}')
+	try:
+		variant_bytes = variant_file_path.read_bytes()
+	except OSError:
+		try:
+			variant_bytes = build_image_variant(raw_bytes, profile)
+		except (OSError, ValueError) as e:
+			logger.warning("Could not convert image %s to profile %s: %s", image_file_path, profile_name, e)
+			return encode_data_uri(raw_bytes, image_file_path)
+		try:
+			data_loader.write_bytes_atomically(variant_file_path, variant_bytes)
+		except OSError as e:
+			logger.warning("Could not persist image variant %s: %s", variant_file_path, e)
+	if len(variant_bytes) >= len(raw_bytes):
+		return encode_data_uri(raw_bytes, image_file_path)
+	return encode_data_uri(variant_bytes, image_file_path, IMAGE_VARIANT_MIME_TYPES[profile['format']])
+
+def compile_image_sidecar(output_path=None):
+	"""
+	Encode every image under assets/images as a data URI and write them to the sidecar folder, with an index
+	recording each source file's size, mtime and SHA-256 so that get_image_data_uri can tell whether it is current.
+	"""
+	output_path = output_path or IMAGE_SIDECAR_PATH
+	files = {}
+	for image_file_path in sorted(x for x in IMAGES_PATH.rglob('*') if x.is_file()):
+		raw_bytes = image_file_path.read_bytes()
+		stat = image_file_path.stat()
+		sha256 = data_loader.hash_bytes(raw_bytes)
+		data_loader.write_bytes_atomically(
+			output_path.joinpath(f'{sha256}.txt'), encode_data_uri(raw_bytes, image_file_path).encode('utf-8')
+		)
+		files[image_file_path.relative_to(data_loader.FILE_PATH).as_posix()] = {
+			'sha256': sha256,
+			'mtime_ns': stat.st_mtime_ns,
+			'size': stat.st_size,
+		}
+
+	# Remove data URIs of images that no longer exist
+	sha256s = set(x['sha256'] for x in files.values())
+	for sidecar_file_path in output_path.glob('*.txt'):
+		if sidecar_file_path.stem not in sha256s:
+			sidecar_file_path.unlink(missing_ok=True)
+
+	index = {
+		'format_version': IMAGE_SIDECAR_FORMAT_VERSION,
+		'built_at': datetime.now().isoformat(timespec='seconds'),
+		'files': files,
+	}
+	data_loader.write_bytes_atomically(output_path.joinpath('index.json'), json.dumps(index).encode('utf-8'))
+	reset_image_sidecar()
+	return index
+
+def load_image_sidecar_index():
+	"""
+	Load the sidecar index once per process.
+	Returns an empty dictionary if the sidecar has not been built or is from an incompatible format.
+	"""
+	global _IMAGE_SIDECAR_INDEX
+	if _IMAGE_SIDECAR_INDEX is None:
+		index = {}
+		try:
+			index = json.loads(IMAGE_SIDECAR_INDEX_PATH.read_bytes())
+		except (OSError, ValueError):
+			index = {}
+		if not isinstance(index, dict) or index.get('format_version') != IMAGE_SIDECAR_FORMAT_VERSION:
+			index = {}
+		_IMAGE_SIDECAR_INDEX = index
+	return _IMAGE_SIDECAR_INDEX
+
+def reset_image_sidecar():
+	"""
+	Forget the loaded sidecar index so that the next lookup reloads it from disk.
+	"""
+	global _IMAGE_SIDECAR_INDEX
+	_IMAGE_SIDECAR_INDEX = None
+	clear_image_cache()
+
+def _get_sidecar_data_uri(image_file_path, signature):
+	"""
+	Return the precomputed data URI of an image, or None if it is not in the sidecar or the source has changed.
+	"""
+	try:
+		entry = load_image_sidecar_index().get('files', {}).get(image_file_path.relative_to(data_loader.FILE_PATH).as_posix())
+	except ValueError:
+		return None
+	if entry is None or entry['size'] != signature[1]:
+		return None
+	if entry['mtime_ns'] != signature[0]:
+		# mtimes are not preserved by checkouts, so fall back to comparing the source hash
+		try:
+			if data_loader.hash_bytes(image_file_path.read_bytes()) != entry['sha256']:
+				return None
+		except OSError:
+			return None
+	try:
+		return IMAGE_SIDECAR_PATH.joinpath(f'{entry["sha256"]}.txt').read_text(encoding='utf-8')
+	except OSError:
+		return None
+
+def get_image_data_uri(src, profile_name=None):
+	"""
+	Return an image as a data URI, or None if the file does not exist.
+	If an image profile (see IMAGE_PROFILES) is given, the image is downscaled and re-encoded first.
+
+	Data URIs are cached per process up to IMAGE_CACHE_MAX_BYTES and re-encoded only when the file's mtime or size
+	changes. Images in an up-to-date sidecar (see compile_image_sidecar) are read from it instead of being encoded.
+	"""
+	if profile_name is not None and profile_name not in IMAGE_PROFILES:
+		raise ValueError(f'Unknown image profile {profile_name!r}, expected one of {list(IMAGE_PROFILES)}')
+	image_file_path = resolve_image_path(src)
+	try:
+		stat = image_file_path.stat()
+	except OSError:
+		return None
+	signature = (stat.st_mtime_ns, stat.st_size)
+	cache_key = (image_file_path, profile_name)
+
+	with _IMAGE_CACHE_LOCK:
+		cached = IMAGE_CACHE.get(cache_key)
+		if cached is not None and cached[:2] == signature:
+			IMAGE_CACHE.move_to_end(cache_key)
+			IMAGE_CACHE_STATS['hits'] += 1
+			return cached[2]
+
+	data_uri = None
+	if profile_name is None:
+		data_uri = _get_sidecar_data_uri(image_file_path, signature)
+	stat_name = 'sidecar_hits'
+	if data_uri is None:
+		try:
+			raw_bytes = image_file_path.read_bytes()
+		except OSError as e:
+			logger.warning("Could not read image %s: %s", image_file_path, e)
+			return None
+		if profile_name is None:
+			data_uri = encode_data_uri(raw_bytes, image_file_path)
+		else:
+			data_uri = _get_variant_data_uri(image_file_path, raw_bytes, profile_name)
+		stat_name = 'misses'
+
+	with _IMAGE_CACHE_LOCK:
+		IMAGE_CACHE_STATS[stat_name] += 1
+		if len(data_uri) <= IMAGE_CACHE_MAX_BYTES:
+			previous = IMAGE_CACHE.pop(cache_key, None)
+			if previous is not None:
+				IMAGE_CACHE_STATS['bytes'] -= len(previous[2])
+			IMAGE_CACHE[cache_key] = (*signature, data_uri)
+			IMAGE_CACHE_STATS['bytes'] += len(data_uri)
+			while IMAGE_CACHE_STATS['bytes'] > IMAGE_CACHE_MAX_BYTES:
+				_, evicted = IMAGE_CACHE.popitem(last=False)
+				IMAGE_CACHE_STATS['bytes'] -= len(evicted[2])
+	return data_uri
+
+def get_image_cache_stats():
+	"""
+	Return the image cache hit/miss counters, number of cached images and size of their data URIs.
+	"""
+	with _IMAGE_CACHE_LOCK:
+		return {**IMAGE_CACHE_STATS, 'images': len(IMAGE_CACHE)}
+
+def clear_image_cache():
+	"""
+	Drop all cached data URIs and reset the counters.
+	"""
+	with _IMAGE_CACHE_LOCK:
+		IMAGE_CACHE.clear()
+		IMAGE_CACHE_STATS.update(hits=0, sidecar_hits=0, misses=0, bytes=0)
@@ -0,0 +1,138 @@
+import json
+import logging
+import threading
+from collections import OrderedDict
+
+from plotly.utils import PlotlyJSONEncoder
+
+from utils import data_loader
+
+REPORT_CACHE_MAX_ENTRIES = 64
+REPORT_CACHE_PERSIST = True
+REPORT_CACHE_PATH = data_loader.BUILD_PATH.joinpath("./report_cache").resolve()
+REPORT_CACHE_MAX_DISK_ENTRIES = 512
+REPORT_CACHE_FORMAT_VERSION = 3
+# Modules that build reports; their source is hashed into every report key, so that reports persisted by
+# an older version of the code are never served
+REPORT_CODE_PATHS = [
+	data_loader.FILE_PATH.joinpath("./pages/reports").resolve(),
+	data_loader.FILE_PATH.joinpath("./utils").resolve(),
+]
+
+# Serialized reports keyed by report key -> JSON bytes of [sidebar, content], in least recently used order
+REPORT_CACHE = OrderedDict()
+REPORT_CACHE_STATS = {'hits': 0, 'disk_hits': 0, 'misses': 0}
+_REPORT_CACHE_LOCK = threading.Lock()
+
+# Hash of the report code, computed once per process by get_code_version()
+_CODE_VERSION = None
+
+logger = logging.getLogger(__name__)
+
+
+def get_code_version():
+	"""
+	Return an id of the report code: the hash of the source of every module under REPORT_CODE_PATHS.
+	"""
+	global _CODE_VERSION
+	if _CODE_VERSION is None:
+		source_file_paths = sorted(x for path in REPORT_CODE_PATHS for x in path.glob('*.py'))
+		_CODE_VERSION = data_loader.hash_bytes(b'\n'.join(
+			x.relative_to(data_loader.FILE_PATH).as_posix().encode('utf-8') + b':' + x.read_bytes()
+			for x in source_file_paths
+		))
+	return _CODE_VERSION
+
+def get_report_key(report_type, institution_type, all_stored_data, config_version, content_version):
+	"""
+	Return a canonical hash of a report request, including the version of the report code.
+	Store names and record fields are sorted. The order of selections within a store is kept,
+	as it sets the order of scenarios in the report.
+	"""
+	payload = json.dumps(
+		[
+			REPORT_CACHE_FORMAT_VERSION, get_code_version(), report_type, institution_type, all_stored_data,
+			config_version, content_version,
+		],
+		sort_keys=True, separators=(',', ':'), default=str
+	)
+	return data_loader.hash_bytes(payload.encode('utf-8'))
+
+def _get_report_file_path(report_key):
+	return REPORT_CACHE_PATH.joinpath(f'{report_key}.json')
+
+def _add_to_memory(report_key, raw_bytes):
+	with _REPORT_CACHE_LOCK:
+		REPORT_CACHE[report_key] = raw_bytes
+		REPORT_CACHE.move_to_end(report_key)
+		while len(REPORT_CACHE) > REPORT_CACHE_MAX_ENTRIES:
+			REPORT_CACHE.popitem(last=False)
+
+def _write_to_disk(report_key, raw_bytes):
+	try:
+		data_loader.write_bytes_atomically(_get_report_file_path(report_key), raw_bytes)
+		report_file_paths = sorted(REPORT_CACHE_PATH.glob('*.json'), key=lambda x: x.stat().st_mtime_ns)
+		for report_file_path in report_file_paths[:-REPORT_CACHE_MAX_DISK_ENTRIES]:
+			report_file_path.unlink(missing_ok=True)
+	except OSError as e:
+		logger.warning("Could not persist report %s to %s: %s", report_key, REPORT_CACHE_PATH, e)
+
+def get_report(report_key):
+	"""
+	Return the cached (sidebar, content) of a report as component JSON, or None if the report is not cached.
+	Reports are looked up in memory first, then on disk if persistence is enabled.
+	"""
+	with _REPORT_CACHE_LOCK:
+		raw_bytes = REPORT_CACHE.get(report_key)
+		if raw_bytes is not None:
+			REPORT_CACHE.move_to_end(report_key)
+			REPORT_CACHE_STATS['hits'] += 1
+
+	if raw_bytes is None and REPORT_CACHE_PERSIST:
+		try:
+			raw_bytes = _get_report_file_path(report_key).read_bytes()
+		except OSError:
+			raw_bytes = None
+		if raw_bytes is not None:
+			_add_to_memory(report_key, raw_bytes)
+			with _REPORT_CACHE_LOCK:
+				REPORT_CACHE_STATS['disk_hits'] += 1
+
+	if raw_bytes is None:
+		with _REPORT_CACHE_LOCK:
+			REPORT_CACHE_STATS['misses'] += 1
+		return None
+	return tuple(json.loads(raw_bytes))
+
+def set_report(report_key, sidebar_layout, content_layout):
+	"""
+	Serialize a generated report, cache it under its key and return its (sidebar, content) as component JSON.
+	Callers get a fresh copy on every hit, so the cached report cannot be modified.
+	"""
+	raw_bytes = json.dumps([sidebar_layout, content_layout], cls=PlotlyJSONEncoder).encode('utf-8')
+	_add_to_memory(report_key, raw_bytes)
+	if REPORT_CACHE_PERSIST:
+		_write_to_disk(report_key, raw_bytes)
+	return tuple(json.loads(raw_bytes))
+
+def get_report_cache_stats():
+	"""
+	Return the report cache hit/miss counters, number of cached reports and their size in bytes.
+	"""
+	with _REPORT_CACHE_LOCK:
+		return {
+			**REPORT_CACHE_STATS,
+			'reports': len(REPORT_CACHE),
+			'bytes': sum(len(x) for x in REPORT_CACHE.values()),
+		}
+
+def clear_report_cache(clear_disk=False):
+	"""
+	Drop all cached reports and reset the hit/miss counters. Persisted reports are only removed if clear_disk is set.
+	"""
+	with _REPORT_CACHE_LOCK:
+		REPORT_CACHE.clear()
+		REPORT_CACHE_STATS.update(hits=0, disk_hits=0, misses=0)
+	if clear_disk:
+		for report_file_path in REPORT_CACHE_PATH.glob('*.json'):
+			report_file_path.unlink(missing_ok=True)
@@ -0,0 +1,245 @@
+import base64
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import dash
+import docx
+import flask
+import pdfkit
+from bs4 import BeautifulSoup, NavigableString
+from docx.shared import Cm
+
+from utils import data_loader
+from utils import reports
+
+# Downloadable report formats, with the image profile (see image_cache.IMAGE_PROFILES) used for their images
+DOWNLOAD_FORMATS = {
+	'html': {'label': 'HTML', 'extension': 'html', 'mimetype': 'text/html', 'image_profile': 'web'},
+	'pdf': {'label': 'PDF', 'extension': 'pdf', 'mimetype': 'application/pdf', 'image_profile': 'print'},
+	'docx': {
+		'label': 'Word',
+		'extension': 'docx',
+		'mimetype': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+		'image_profile': 'print',
+	},
+}
+REPORT_DOWNLOAD_PATH = data_loader.BUILD_PATH.joinpath("./report_downloads").resolve()
+REPORT_DOWNLOAD_MAX_DISK_ENTRIES = 128
+REPORT_DOWNLOAD_MAX_WORKERS = 2
+REPORT_DOWNLOAD_ROUTE = '/reports/download/<report_key>.<download_format>'
+# Path of the wkhtmltopdf executable used for PDFs, looked up on the PATH if not set
+WKHTMLTOPDF_PATH = None
+DOCX_MAX_IMAGE_WIDTH = Cm(15)
+
+REPORT_KEY_PATTERN = re.compile(r'[0-9a-f]{64}')
+HEADING_PATTERN = re.compile(r'h[1-6]')
+
+# Renders run in a thread pool, so that slow renders (PDFs in particular) never block the Dash workers
+_EXECUTOR = ThreadPoolExecutor(max_workers=REPORT_DOWNLOAD_MAX_WORKERS, thread_name_prefix='report-download')
+# Renders in progress or failed in this process, keyed by (report key, download format) -> Future
+_DOWNLOAD_JOBS = {}
+_DOWNLOAD_JOBS_LOCK = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def get_download_file_path(report_key, download_format):
+	return REPORT_DOWNLOAD_PATH.joinpath(f'{report_key}.{DOWNLOAD_FORMATS[download_format]["extension"]}')
+
+def get_download_url(report_key, download_format):
+	"""
+	Return the URL of the download route for a rendered report, relative to the app's path prefix.
+	"""
+	return dash.get_relative_path(f'/reports/download/{report_key}.{DOWNLOAD_FORMATS[download_format]["extension"]}')
+
+def _write_atomically(output_file_path, write):
+	# Same as data_loader.write_bytes_atomically, for writers that stream to a file path
+	output_file_path.parent.mkdir(parents=True, exist_ok=True)
+	fd, tmp_file_path = tempfile.mkstemp(dir=output_file_path.parent, prefix=f'.{output_file_path.name}.')
+	os.close(fd)
+	try:
+		write(tmp_file_path)
+		os.chmod(tmp_file_path, 0o644)
+		os.replace(tmp_file_path, output_file_path)
+	except BaseException:
+		if os.path.exists(tmp_file_path):
+			os.remove(tmp_file_path)
+		raise
+
+def _add_docx_picture(run, src):
+	if not src.startswith('data:'):
+		return
+	try:
+		image_bytes = base64.b64decode(src.split(',', 1)[1])
+		shape = run.add_picture(io.BytesIO(image_bytes))
+	except Exception as e:
+		logger.warning("Could not add image to Word report: %s", e)
+		return
+	if shape.width > DOCX_MAX_IMAGE_WIDTH:
+		shape.height = int(shape.height * DOCX_MAX_IMAGE_WIDTH / shape.width)
+		shape.width = DOCX_MAX_IMAGE_WIDTH
+
+def _add_docx_runs(paragraph, element, bold=False, italic=False):
+	for node in element.children:
+		if isinstance(node, NavigableString):
+			text = str(node).replace('\n', ' ')
+			if text.strip() or (text and paragraph.runs):
+				run = paragraph.add_run(text)
+				run.bold = bold or None
+				run.italic = italic or None
+		elif node.name in ('strong', 'b'):
+			_add_docx_runs(paragraph, node, True, italic)
+		elif node.name in ('em', 'i'):
+			_add_docx_runs(paragraph, node, bold, True)
+		elif node.name == 'br':
+			paragraph.add_run().add_break()
+		elif node.name == 'img':
+			_add_docx_picture(paragraph.add_run(), node.get('src', ''))
+		elif node.name not in ('ul', 'ol', 'table'):
+			_add_docx_runs(paragraph, node, bold, italic)
+
+def _add_docx_list(document, element, level=1):
+	style = 'List Number' if element.name == 'ol' else 'List Bullet'
+	style = style if level == 1 else f'{style} {min(level, 3)}'
+	for item in element.find_all('li', recursive=False):
+		_add_docx_runs(document.add_paragraph(style=style), item)
+		for sub_list in item.find_all(['ul', 'ol'], recursive=False):
+			_add_docx_list(document, sub_list, level + 1)
+
+def _add_docx_table(document, element):
+	rows = element.find_all('tr')
+	n_columns = max((len(row.find_all(['th', 'td'], recursive=False)) for row in rows), default=0)
+	if not n_columns:
+		return
+	table = document.add_table(rows=len(rows), cols=n_columns)
+	table.style = 'Table Grid'
+	for row, table_row in zip(rows, table.rows):
+		for cell, table_cell in zip(row.find_all(['th', 'td'], recursive=False), table_row.cells):
+			table_cell.text = cell.get_text(' ', strip=True)
+			if cell.name == 'th':
+				for run in table_cell.paragraphs[0].runs:
+					run.bold = True
+
+def _add_docx_blocks(document, element):
+	for node in element.children:
+		if isinstance(node, NavigableString):
+			if node.strip():
+				document.add_paragraph(node.strip())
+		elif HEADING_PATTERN.fullmatch(node.name):
+			document.add_heading(node.get_text(' ', strip=True), level=int(node.name[1]))
+		elif node.name == 'p':
+			_add_docx_runs(document.add_paragraph(), node)
+		elif node.name in ('ul', 'ol'):
+			_add_docx_list(document, node)
+		elif node.name == 'table':
+			_add_docx_table(document, node)
+		elif node.name == 'img':
+			_add_docx_picture(document.add_paragraph().add_run(), node.get('src', ''))
+		elif node.name not in ('style', 'script'):
+			_add_docx_blocks(document, node)
+
+def convert_html_to_docx(html_file_path, output_file_path):
+	"""
+	Convert a standalone HTML report into a Word document: headings, paragraphs, lists, tables and inlined images.
+	"""
+	with open(html_file_path, encoding='utf-8') as f:
+		soup = BeautifulSoup(f, 'html.parser')
+	document = docx.Document()
+	_add_docx_blocks(document, soup.body or soup)
+	document.save(output_file_path)
+
+def render_report_download(report_key, download_format, build_content):
+	"""
+	Render a report to a file in the download cache and return its path.
+	build_content is called in the rendering thread and returns the report content components.
+	"""
+	image_profile = DOWNLOAD_FORMATS[download_format]['image_profile']
+	output_file_path = get_download_file_path(report_key, download_format)
+	content = build_content()
+	if download_format == 'html':
+		_write_atomically(
+			output_file_path, lambda x: reports.write_full_html(content, x, image_profile, used_css_only=True)
+		)
+	else:
+		with tempfile.TemporaryDirectory(prefix='report-download-') as tmp_dir:
+			html_file_path = os.path.join(tmp_dir, 'report.html')
+			reports.write_full_html(content, html_file_path, image_profile, used_css_only=True)
+			if download_format == 'pdf':
+				configuration = pdfkit.configuration(wkhtmltopdf=WKHTMLTOPDF_PATH or '')
+				_write_atomically(output_file_path, lambda x: pdfkit.from_file(
+					html_file_path, x, configuration=configuration, options={'encoding': 'UTF-8', 'quiet': ''}
+				))
+			else:
+				_write_atomically(output_file_path, lambda x: convert_html_to_docx(html_file_path, x))
+
+	# Keep the most recent downloads on disk
+	try:
+		download_file_paths = sorted(
+			(x for x in REPORT_DOWNLOAD_PATH.iterdir() if not x.name.startswith('.')), key=lambda x: x.stat().st_mtime_ns
+		)
+		for download_file_path in download_file_paths[:-REPORT_DOWNLOAD_MAX_DISK_ENTRIES]:
+			download_file_path.unlink(missing_ok=True)
+	except OSError as e:
+		logger.warning("Could not clean up report downloads in %s: %s", REPORT_DOWNLOAD_PATH, e)
+	return output_file_path
+
+def request_report_download(report_key, download_format, build_content):
+	"""
+	Return the status of a report download, starting its render in the background if it is neither on disk nor
+	in progress in this process: {'status': 'ready' | 'pending' | 'failed', 'url': ..., 'error': ...}.
+	A failed render is reported once and retried on the next request.
+	"""
+	if download_format not in DOWNLOAD_FORMATS:
+		raise ValueError(f'Unknown download format {download_format!r}, expected one of {list(DOWNLOAD_FORMATS)}')
+	if get_download_file_path(report_key, download_format).exists():
+		return {'status': 'ready', 'url': get_download_url(report_key, download_format)}
+
+	job_key = (report_key, download_format)
+	with _DOWNLOAD_JOBS_LOCK:
+		future = _DOWNLOAD_JOBS.get(job_key)
+		if future is not None and future.done():
+			del _DOWNLOAD_JOBS[job_key]
+			error = future.exception()
+			if error is None:
+				return {'status': 'ready', 'url': get_download_url(report_key, download_format)}
+			logger.warning("Could not render %s report %s: %s", download_format, report_key, error)
+			return {'status': 'failed', 'error': str(error)}
+		if future is None:
+			_DOWNLOAD_JOBS[job_key] = _EXECUTOR.submit(render_report_download, report_key, download_format, build_content)
+	return {'status': 'pending'}
+
+def send_report_download(report_key, download_format):
+	"""
+	Flask view streaming a rendered report from the download cache.
+	"""
+	extensions = {v['extension']: k for k, v in DOWNLOAD_FORMATS.items()}
+	if not REPORT_KEY_PATTERN.fullmatch(report_key) or download_format not in extensions:
+		flask.abort(404)
+	download_format = extensions[download_format]
+	download_file_path = get_download_file_path(report_key, download_format)
+	if not download_file_path.exists():
+		flask.abort(404)
+	return flask.send_file(
+		download_file_path,
+		mimetype=DOWNLOAD_FORMATS[download_format]['mimetype'],
+		as_attachment=True,
+		download_name=f'climate_narrative_report.{DOWNLOAD_FORMATS[download_format]["extension"]}',
+	)
+
+def clear_report_downloads():
+	"""
+	Remove all rendered reports from the download cache.
+	"""
+	for download_file_path in REPORT_DOWNLOAD_PATH.glob('*'):
+		download_file_path.unlink(missing_ok=True)
+
+def register_download_route(server):
+	"""
+	Register the report download route on the app's Flask server.
+	"""
+	server.add_url_rule(REPORT_DOWNLOAD_ROUTE, 'report_download', send_report_download)
@@ -0,0 +1,100 @@
+from utils import config_registry
+from utils import data_loader
+
+
+def _join_output_structure(selection_records, output_structure_plan):
+	# Left join on materiality, keeping the selection order and then the output structure order
+	plan = []
+	for r in selection_records:
+		instructions = [x for x in output_structure_plan if x['materiality'] == r.get('materiality')]
+		for x in instructions or [{}]:
+			plan.append({**r, **{k: v for k, v in x.items() if k != 'materiality'}})
+	return plan
+
+def compile_institutional_selection_plan(user_selection_records, output_structure_plan):
+	mapping_columns = [
+		x for x in config_registry.get_config_df('exposure_sector_product_mapping').columns
+		if x not in ['institution', 'exposure', 'sector', 'type']
+	]
+	selection_records = [
+		{{'label': 'materiality', 'ptype': 'type'}.get(k, k): v for k, v in r.items() if k not in ['id', 'value']}
+		for r in user_selection_records if r.get('exposure') != 'Scenarios'
+	]
+
+	# Look up exposure-sector-product mapping to get yml file (sovereigns apply to all institutions and types)
+	selection_records = [
+		{**r, **{x: m.get(x) for x in mapping_columns}}
+		for r in selection_records if r['exposure'] == 'Sovereigns'
+		for m in config_registry.get_exposure_sector_mapping_rows(r['exposure'], r['sector']) or [{}]
+	] + [
+		{**r, **{x: m.get(x) for x in mapping_columns}}
+		for r in selection_records if r['exposure'] != 'Sovereigns'
+		for m in config_registry.get_mapping_rows(r['institution'], r['exposure'], r['sector'], r['type']) or [{}]
+	]
+	selection_records = [r for r in selection_records if r['materiality'] != 'N/A']
+	plan = _join_output_structure(selection_records, output_structure_plan)
+
+	# Sort by section, sector yml order and materiality
+	sector_metadata = config_registry.get_sector_metadata_df().to_dict(orient='index')
+	for x in plan:
+		metadata = sector_metadata.get(x.get('sector_yml_file'), {})
+		x['yml_sector'] = metadata.get('sector')
+		# Rows without a sector yml file (selections with no mapping row) sort last, as NaN did in pandas
+		x['sector_sort_order'] = metadata.get('sector_key', float('inf'))
+	return sorted(plan, key=lambda x: (x.get('sort_order', float('inf')), x['sector_sort_order'], x['materiality']))
+
+def compile_sector_selection_plan(user_selection_records, output_structure_plan):
+	sector_metadata_records = config_registry.get_sector_metadata_df().to_dict(orient='records')
+	selection_records = [
+		{'exposure': r.get('exposure'), 'materiality': r.get('label'), 'sector_yml_file': m['sector_yml_file']}
+		for r in user_selection_records if r.get('exposure') != 'Scenarios'
+		for m in sector_metadata_records if m['name'] == r.get('sector')
+	]
+	plan = _join_output_structure(selection_records, output_structure_plan)
+
+	# Sort by sector name
+	sector_metadata = {m['sector_yml_file']: m for m in sector_metadata_records}
+	yml_sectors = sorted(set(sector_metadata[x['sector_yml_file']]['sector'] for x in plan))
+	plan = [
+		{
+			'sector_sort_order': yml_sectors.index(sector_metadata[x['sector_yml_file']]['sector']),
+			'yml_sector': sector_metadata[x['sector_yml_file']]['sector'],
+			**x
+		}
+		for x in plan
+	]
+	return sorted(plan, key=lambda x: x['sector_sort_order'])
+
+def compile_scenario_selection_plan(user_selection_records, output_structure_plan):
+	plan = []
+	for x in output_structure_plan:
+		scenarios = [r.get('label') for r in user_selection_records if r.get('report') == x['report_type']]
+		for scenario in scenarios or [None]:
+			plan.append({**x, 'scenario': scenario} if scenario is not None else dict(x))
+	return plan
+
+def compile_report_plan(all_stored_data, report_type):
+	"""
+	Compile the user selections and config into a report plan.
+
+	The plan holds the flattened user selections, the selected scenarios in selection order, the output structure
+	instructions of the report type, and one instruction per selection and output structure row
+	(with its sector and product yml files, section, sub section and content_id), in report order.
+	"""
+	user_selection_records = data_loader.get_user_selection_records(all_stored_data)
+	output_structure_plan = config_registry.get_output_structure_plan(report_type)
+	if report_type == 'Institutional':
+		selection_plan = compile_institutional_selection_plan(user_selection_records, output_structure_plan)
+	elif report_type == 'Scenario':
+		selection_plan = compile_scenario_selection_plan(user_selection_records, output_structure_plan)
+	else:
+		selection_plan = compile_sector_selection_plan(user_selection_records, output_structure_plan)
+	return {
+		'user_selections': user_selection_records,
+		'scenarios': list(dict.fromkeys(r['label'] for r in user_selection_records if r.get('exposure') == 'Scenarios')),
+		'output_structure': output_structure_plan,
+		'selections': selection_plan,
+	}
+
+def filter_plan_by_section(plan_records, section, sub_section):
+	return [x for x in plan_records if x.get('output_structure') == section and x.get('sub_section') == sub_section]
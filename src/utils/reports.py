@@ -1,11 +1,40 @@
 from dash import dash_table
 from html import escape as _html_escape
-from markdown import markdown as _md
+import markdown
 import os
-import base64
-import mimetypes
-from pathlib import Path
-SERIALIZATION_CACHE = {}
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+
+from utils import data_loader
+from utils import image_cache
+
+# Serialized HTML of narrative blocks and tables keyed by a digest of their content -> (UTF-8 size, HTML),
+# in least recently used order
+SERIALIZATION_CACHE = OrderedDict()
+SERIALIZATION_CACHE_MAX_BYTES = 64 * 1024 * 1024
+SERIALIZATION_CACHE_STATS = {'hits': 0, 'misses': 0, 'bytes': 0}
+_SERIALIZATION_CACHE_LOCK = threading.Lock()
+
+MARKDOWN_IMG_PATTERN = re.compile(r'<img\s+([^>]*?)src="([^"]+)"([^>]*)>', re.IGNORECASE)
+MARKDOWN_ALT_PATTERN = re.compile(r'alt="([^"]*)"')
+MARKDOWN_LINK_PATTERN = re.compile(r'<a\s+([^>]*?)href="([^"]+)"([^>]*)>(.*?)</a>', re.IGNORECASE | re.DOTALL)
+
+# One Markdown converter per thread, as converters keep state between conversions
+_MARKDOWN_LOCAL = threading.local()
+
+# Minified stylesheet of exported reports, re-read when the file changes
+EXTERNAL_CSS_PATH = data_loader.FILE_PATH.joinpath("./assets/css/style.css").resolve()
+_EXTERNAL_CSS = {'signature': None, 'css': '', 'rules': ()}
+_EXTERNAL_CSS_LOCK = threading.Lock()
+
+CSS_COMMENT_PATTERN = re.compile(r'/\*.*?\*/', re.DOTALL)
+CSS_WHITESPACE_PATTERN = re.compile(r'\s+')
+CSS_PUNCTUATION_PATTERN = re.compile(r'\s*([{};,>])\s*|(?<=:)\s+')
+CSS_NOT_PATTERN = re.compile(r':not\([^)]*\)')
+CSS_NAME_PATTERN = re.compile(r'[.#][\w-]+')
 
 
 def filter_yml_by_scenario(yml, scenario, scenario_mapping_df):
@@ -14,13 +43,6 @@ def filter_yml_by_scenario(yml, scenario, scenario_mapping_df):
 	scenario_risk_level = filtered_scenario_mapping_df['risk_level'].iloc[0]
 	return yml[scenario_risk_type][scenario_risk_level]
 
-def filter_user_selection_by_section(user_selection_df, section, sub_section):
-	filtered_user_selection_df = user_selection_df[
-		(user_selection_df['output_structure'] == section)
-		& (user_selection_df['sub_section'] == sub_section)
-	]
-	return filtered_user_selection_df
-
 def convert_to_bullet_points(df, bullet_point_column_name):
 	groupby_variables_list = [x for x in df if x != bullet_point_column_name]
 	output_df = df.sort_values(bullet_point_column_name)
@@ -31,35 +53,114 @@ def convert_to_bullet_points(df, bullet_point_column_name):
 	return output_df
 
 def load_external_css():
-	here = Path(__file__).resolve()
-	for parent in [here.parent, *here.parents]:
-		candidate = parent / 'assets' / 'css' / 'style.css'
-		if candidate.exists():
-			try:
-				return candidate.read_text(encoding='utf-8')
-			except Exception:
-				return ""
-	return ""
+	"""
+	Return the app's stylesheet, minified. It is read once and re-read only when the file's mtime or size changes.
+	"""
+	try:
+		stat = EXTERNAL_CSS_PATH.stat()
+	except OSError:
+		return ''
+	signature = (stat.st_mtime_ns, stat.st_size)
+	if _EXTERNAL_CSS['signature'] != signature:
+		try:
+			css = minify_css(EXTERNAL_CSS_PATH.read_text(encoding='utf-8'))
+		except (OSError, UnicodeDecodeError):
+			return ''
+		with _EXTERNAL_CSS_LOCK:
+			_EXTERNAL_CSS.update(signature=signature, css=css, rules=tuple(_split_css_rules(css)))
+	return _EXTERNAL_CSS['css']
+
+def minify_css(css):
+	css = CSS_COMMENT_PATTERN.sub('', css)
+	css = CSS_WHITESPACE_PATTERN.sub(' ', css)
+	css = CSS_PUNCTUATION_PATTERN.sub(lambda x: x.group(1) or '', css)
+	return css.replace(';}', '}').strip()
+
+def _split_css_rules(css):
+	# Split minified CSS into (selectors, body) rules; at-rules are kept whole with selectors set to None
+	rules = []
+	i = 0
+	while i < len(css):
+		open_index = css.find('{', i)
+		if open_index == -1:
+			break
+		depth = 0
+		for close_index in range(open_index, len(css)):
+			if css[close_index] == '{':
+				depth += 1
+			elif css[close_index] == '}':
+				depth -= 1
+				if depth == 0:
+					break
+		prelude = css[i:open_index]
+		if prelude.startswith('@'):
+			rules.append((None, css[i:close_index + 1]))
+		else:
+			rules.append((prelude.split(','), css[open_index:close_index + 1]))
+		i = close_index + 1
+	return rules
+
+def get_css_names(component):
+	"""
+	Return the class names and ids ('.name' and '#name') used by a component tree, including generated tables.
+	"""
+	names = set()
+	stack = [component]
+	while stack:
+		c = stack.pop()
+		if isinstance(c, (list, tuple)):
+			stack.extend(c)
+			continue
+		if c is None or isinstance(c, (str, int, float)):
+			continue
+		if isinstance(c, dash_table.DataTable):
+			names.add('.datatable')
+			continue
+		class_name = getattr(c, 'className', None)
+		if class_name:
+			names.update(f'.{x}' for x in str(class_name).split())
+		comp_id = getattr(c, 'id', None)
+		if comp_id:
+			names.add(f'#{comp_id}')
+		stack.append(getattr(c, 'children', None))
+	return names
+
+def get_report_css(css_names=None):
+	"""
+	Return the minified stylesheet for exported reports.
+	If the class names and ids of the report are given (see get_css_names), rules whose selectors need other
+	classes or ids are left out. Rules on element types alone are always kept.
+	"""
+	css = load_external_css()
+	if css_names is None:
+		return css
+	used_rules = []
+	for selectors, body in _EXTERNAL_CSS['rules']:
+		if selectors is None:
+			used_rules.append(body)
+			continue
+		used_selectors = [
+			x for x in selectors
+			if set(CSS_NAME_PATTERN.findall(CSS_NOT_PATTERN.sub('', x))) <= css_names
+		]
+		if used_selectors:
+			used_rules.append(f'{",".join(used_selectors)}{body}')
+	return ''.join(used_rules)
 
 def _style_dict_to_css(style):
 	if not style:
 		return ''
 	return '; '.join(f'{str(k).replace("_", "-")}:{v}' for k, v in style.items())
 
-def _inline_image_src(src):
-	src = 'src/' + src
+def _inline_image_src(src, image_profile=None):
 	if not src:
 		return ''
 	if src.startswith(('http://', 'https://', 'data:')):
 		return src
-	if os.path.exists(src):
-		mime, _ = mimetypes.guess_type(src)
-		if not mime:
-			mime = 'application/octet-stream'
-		with open(src, 'rb') as f:
-			b64 = base64.b64encode(f.read()).decode('utf-8')
-		return f'data:{mime};base64,{b64}'
-	return src
+	data_uri = image_cache.get_image_data_uri(src, image_profile)
+	if data_uri is None:
+		return src
+	return data_uri
 
 def _serialize_datatable(dt):
 	cols = getattr(dt, 'columns', []) or []
@@ -78,71 +179,143 @@ def _serialize_datatable(dt):
 		)
 	return f'<table class="datatable"><thead>{header_html}</thead><tbody>{"".join(body_rows)}</tbody></table>'
 
-def _markdown_to_html(text):
+def _get_markdown_converter():
+	converter = getattr(_MARKDOWN_LOCAL, 'converter', None)
+	if converter is None:
+		converter = _MARKDOWN_LOCAL.converter = markdown.Markdown()
+	return converter
+
+def _normalize_link(match):
+	# Ensure target + rel, keep inner HTML (do not escape inner)
+	href, inner = match.group(2), match.group(4)
+	return f'<a href="{_html_escape(href)}" target="_blank" rel="noopener noreferrer">{inner}</a>'
+
+def get_markdown_digest(text):
+	return _get_digest(['Markdown', text])
+
+def render_markdown(text):
+	"""
+	Convert Markdown text to HTML with links opening in a new tab. Images are left to be inlined by the caller.
+	"""
+	html = _get_markdown_converter().reset().convert(text)
+	return MARKDOWN_LINK_PATTERN.sub(_normalize_link, html)
+
+def _markdown_to_html(text, image_profile=None):
 	if text is None:
 		return ''
-	if not _md:
-		return f'<p>{_html_escape(str(text))}</p>'
-	import re
-	html = _md(str(text))
+
+	# Markdown is rendered once per distinct text, or taken from the content bundle if it was rendered at compile
+	# time; images are inlined on every use so that they follow the files
+	text = str(text)
+	digest = get_markdown_digest(text)
+	html = _get_cached_serialization(digest)
+	if html is None:
+		html = data_loader.load_content_bundle().get('markdown_html', {}).get(digest)
+		if html is None:
+			html = render_markdown(text)
+		_set_cached_serialization(digest, html)
 
 	# Inline <img> tags (produced by markdown from ![]()) and local paths -> data URIs
 	def _inline_img(match):
 		pre_attrs, src, post_attrs = match.group(1), match.group(2), match.group(3)
 		# Preserve existing alt if present
-		alt_match = re.search(r'alt="([^"]*)"', pre_attrs + post_attrs)
+		alt_match = MARKDOWN_ALT_PATTERN.search(pre_attrs + post_attrs)
 		alt = alt_match.group(1) if alt_match else ''
-		inlined_src = _html_escape(_inline_image_src(src))
+		inlined_src = _html_escape(_inline_image_src(src, image_profile))
 		return f'<img src="{inlined_src}" alt="{_html_escape(alt)}" />'
-	html = re.sub(r'<img\s+([^>]*?)src="([^"]+)"([^>]*)>', _inline_img, html, flags=re.IGNORECASE)
-
-	# Normalize links: ensure target + rel, keep inner HTML (do not escape inner)
-	def _inline_link(match):
-		pre_attrs, href, post_attrs, inner = match.group(1), match.group(2), match.group(3), match.group(4)
-		escaped_href = _html_escape(href)
-		return f'<a href="{escaped_href}" target="_blank" rel="noopener noreferrer">{inner}</a>'
-	html = re.sub(r'<a\s+([^>]*?)href="([^"]+)"([^>]*)>(.*?)</a>', _inline_link, html, flags=re.IGNORECASE | re.DOTALL)
+	if '<img' in html.lower():
+		html = MARKDOWN_IMG_PATTERN.sub(_inline_img, html)
 
 	return html
 
-def serialize_component(component):
+def _get_digest(value):
+	return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+def _get_cached_serialization(digest):
+	with _SERIALIZATION_CACHE_LOCK:
+		cached = SERIALIZATION_CACHE.get(digest)
+		if cached is None:
+			SERIALIZATION_CACHE_STATS['misses'] += 1
+			return None
+		SERIALIZATION_CACHE.move_to_end(digest)
+		SERIALIZATION_CACHE_STATS['hits'] += 1
+		return cached[1]
+
+def _set_cached_serialization(digest, html_str):
+	n_bytes = len(html_str.encode('utf-8'))
+	with _SERIALIZATION_CACHE_LOCK:
+		if digest in SERIALIZATION_CACHE or n_bytes > SERIALIZATION_CACHE_MAX_BYTES:
+			return
+		SERIALIZATION_CACHE[digest] = (n_bytes, html_str)
+		SERIALIZATION_CACHE_STATS['bytes'] += n_bytes
+		while SERIALIZATION_CACHE_STATS['bytes'] > SERIALIZATION_CACHE_MAX_BYTES:
+			_, (evicted_n_bytes, _) = SERIALIZATION_CACHE.popitem(last=False)
+			SERIALIZATION_CACHE_STATS['bytes'] -= evicted_n_bytes
+
+def get_serialization_cache_stats():
+	"""
+	Return the serialization cache hit/miss counters, hit rate, number of entries and UTF-8 size of the cached HTML.
+	"""
+	with _SERIALIZATION_CACHE_LOCK:
+		lookups = SERIALIZATION_CACHE_STATS['hits'] + SERIALIZATION_CACHE_STATS['misses']
+		return {
+			**SERIALIZATION_CACHE_STATS,
+			'hit_rate': SERIALIZATION_CACHE_STATS['hits'] / lookups if lookups else 0.0,
+			'entries': len(SERIALIZATION_CACHE),
+		}
+
+def clear_serialization_cache():
+	"""
+	Drop all cached HTML and reset the counters.
+	"""
+	with _SERIALIZATION_CACHE_LOCK:
+		SERIALIZATION_CACHE.clear()
+		SERIALIZATION_CACHE_STATS.update(hits=0, misses=0, bytes=0)
+
+def serialize_component(component, image_profile=None):
+	return ''.join(iter_serialize_component(component, image_profile))
+
+def iter_serialize_component(component, image_profile=None):
+	"""
+	Serialize a Dash component tree to HTML chunks, depth first.
+	Only the open elements of the current branch are held in memory, so the report can be streamed as it is serialized.
+	Images are inlined as data URIs, size-optimized if an image profile (see image_cache.IMAGE_PROFILES) is given.
+	"""
 	if component is None:
-		return ''
+		return
 	# Primitive
 	if isinstance(component, (str, int, float)):
-		return _html_escape(str(component)).replace('\n', ' ')
+		yield _html_escape(str(component)).replace('\n', ' ')
+		return
 	# List / tuple
 	if isinstance(component, (list, tuple)):
-		return ''.join(serialize_component(c) for c in component)
-	# Avoid re-serializing same object (by id())
-	cid = id(component)
-	if cid in SERIALIZATION_CACHE:
-		return SERIALIZATION_CACHE[cid]
+		for c in component:
+			yield from iter_serialize_component(c, image_profile)
+		return
 
-	# DataTable
+	# DataTable, cached by its columns and data
 	if isinstance(component, dash_table.DataTable):
-		html_str = _serialize_datatable(component)
-		SERIALIZATION_CACHE[cid] = html_str
-		return html_str
+		digest = _get_digest([
+			'DataTable', getattr(component, 'columns', None) or [], getattr(component, 'data', None) or []
+		])
+		html_str = _get_cached_serialization(digest)
+		if html_str is None:
+			html_str = _serialize_datatable(component)
+			_set_cached_serialization(digest, html_str)
+		yield html_str
+		return
 
 	cls_name = component.__class__.__name__
 
-	# dcc.Markdown
+	# dcc.Markdown, cached by its text
 	if cls_name == 'Markdown':
-		html_str = _markdown_to_html(getattr(component, 'children', '')[0])
-		SERIALIZATION_CACHE[cid] = html_str
-		return html_str
+		children = getattr(component, 'children', '')
+		yield _markdown_to_html(children[0] if isinstance(children, (list, tuple)) else children, image_profile)
+		return
 
 	# Map Dash HTML component class names to tag
 	tag = cls_name.lower()
 
-	children = getattr(component, 'children', None)
-	inner_html = ''
-	if isinstance(children, (list, tuple)):
-		inner_html = ''.join(serialize_component(c) for c in children)
-	else:
-		inner_html = serialize_component(children)
-
 	attrs = []
 	comp_id = getattr(component, 'id', None)
 	if comp_id:
@@ -168,27 +341,48 @@ def serialize_component(component):
 	if tag == 'img':
 		src = getattr(component, 'src', None)
 		if src:
-			attrs.append(f'src="{_html_escape(_inline_image_src(src))}"')
+			attrs.append(f'src="{_html_escape(_inline_image_src(src, image_profile))}"')
 		alt = getattr(component, 'alt', '') or ''
 		attrs.append(f'alt="{_html_escape(str(alt))}"')
 
 	void_tags = {'img', 'br', 'hr', 'meta', 'link', 'input'}
 	attr_str = (' ' + ' '.join(attrs)) if attrs else ''
 	if tag in void_tags:
-		html_str = f'<{tag}{attr_str} />'
-		SERIALIZATION_CACHE[cid] = html_str
-		return html_str
-
-	html_str = f'<{tag}{attr_str}>{inner_html}</{tag}>'
-	SERIALIZATION_CACHE[cid] = html_str
-	return html_str
+		yield f'<{tag}{attr_str} />'
+		return
+	yield f'<{tag}{attr_str}>'
+	yield from iter_serialize_component(getattr(component, 'children', None), image_profile)
+	yield f'</{tag}>'
 
 def wrap_full_html(body_html: str) -> str:
-	return (
+	return ''.join(iter_full_html([body_html]))
+
+def iter_full_html(body_chunks, css=None):
+	"""
+	Wrap HTML body chunks, e.g. from iter_serialize_component, in a standalone HTML document with the app's CSS,
+	or the given CSS.
+	"""
+	yield (
 		'<!DOCTYPE html><html><head><meta charset="utf-8">'
 		'<title>Report</title>'
-		f'<style>{load_external_css() or ""}</style>'
+		f'<style>{get_report_css() if css is None else css}</style>'
 		'</head><body>'
-		f'{body_html}'
-		'</body></html>'
 	)
+	yield from body_chunks
+	yield '</body></html>'
+
+def write_full_html(component, file, image_profile=None, used_css_only=False):
+	"""
+	Stream a component tree as a standalone HTML document to a text file object or a file path.
+	If used_css_only is set, only the CSS rules that can apply to the report are inlined.
+	Return the number of characters written.
+	"""
+	if isinstance(file, (str, os.PathLike)):
+		with open(file, 'w', encoding='utf-8') as f:
+			return write_full_html(component, f, image_profile, used_css_only)
+	css = get_report_css(get_css_names(component)) if used_css_only else None
+	size = 0
+	for chunk in iter_full_html(iter_serialize_component(component, image_profile), css):
+		file.write(chunk)
+		size += len(chunk)
+	return size
@@ -0,0 +1,13 @@
+import sys
+from pathlib import Path
+
+import dash
+
+sys.path.insert(0, str(Path(__file__).parent.parent.joinpath('src')))
+
+from utils import config_registry
+from utils import data_loader
+
+# Pages register themselves on import, which needs an app; pages_folder='' keeps the other pages from loading
+dash.Dash(__name__, use_pages=True, pages_folder='')
+config_registry.load_config(data_loader.load_config_json())
@@ -0,0 +1,72 @@
+import json
+import shutil
+
+import pytest
+
+from pages.reports import generate_report
+from utils import data_loader
+from utils import report_cache
+
+REPORT_QUERY = '?report-type=Institutional&institution-type=Bank'
+REPORT_SELECTIONS = {
+	'Real Estate': [{
+		'report': 'Institutional',
+		'id': 'Bank|Real Estate|Commercial|Revenue generating',
+		'institution': 'Bank',
+		'exposure': 'Real Estate',
+		'sector': 'Commercial',
+		'ptype': 'Revenue generating',
+		'label': 'High',
+		'value': 'Bank|Real Estate|Commercial|Revenue generating|High',
+	}],
+	'Scenarios': [{
+		'report': 'Institutional',
+		'id': 'Orderly Scenarios',
+		'institution': 'Bank',
+		'exposure': 'Scenarios',
+		'sector': 'N/A',
+		'ptype': 'N/A',
+		'label': 'Orderly Scenarios',
+		'value': 'Orderly Scenarios',
+	}],
+}
+ORIGINAL_TEXT = 'sector encompasses a wide range of activities'
+EDITED_TEXT = 'sector covers an edited range of activities'
+
+
+@pytest.fixture
+def page_contents_path(tmp_path, monkeypatch):
+	# Work on a copy of the page contents, with an empty report cache that is not persisted between tests
+	page_contents_path = tmp_path.joinpath('page_contents')
+	shutil.copytree(data_loader.PAGE_CONTENTS_PATH, page_contents_path)
+	monkeypatch.setattr(data_loader, 'PAGE_CONTENTS_PATH', page_contents_path)
+	monkeypatch.setattr(report_cache, 'REPORT_CACHE_PATH', tmp_path.joinpath('report_cache'))
+	data_loader.clear_yml_cache()
+	report_cache.clear_report_cache()
+	yield page_contents_path
+	data_loader.clear_yml_cache()
+	report_cache.clear_report_cache()
+
+def generate_report_json():
+	report = generate_report.generate_all_reports(
+		REPORT_QUERY, REPORT_SELECTIONS, 'Institutional', '/reports/generate-report'
+	)
+	return json.dumps(report)
+
+def test_edited_yml_file_is_not_served_from_report_cache(page_contents_path):
+	assert ORIGINAL_TEXT in generate_report_json()
+	assert ORIGINAL_TEXT in generate_report_json()
+	assert report_cache.get_report_cache_stats()['hits'] == 1
+
+	yml_file_path = page_contents_path.joinpath('exposure_class/sector/real_estate.yml')
+	yml_file_path.write_text(
+		yml_file_path.read_text(encoding='utf-8').replace(ORIGINAL_TEXT, EDITED_TEXT), encoding='utf-8'
+	)
+	report_json = generate_report_json()
+	assert EDITED_TEXT in report_json
+	assert ORIGINAL_TEXT not in report_json
+
+def test_added_yml_file_changes_content_version(page_contents_path):
+	content_version = data_loader.get_content_version()
+	page_contents_path.joinpath('new_page.yml').write_text('page: {}\n', encoding='utf-8')
+	assert data_loader.get_content_version() != content_version